@@ -1,6 +1,8 @@
 from django.contrib.auth.backends import BaseBackend
 from django.contrib.auth import get_user_model
 
+from users.authentication import get_cached_user
+
 class EmailAuthBackend(BaseBackend):
     def authenticate(self, request, username=None, password=None):
         user_model = get_user_model()
@@ -13,8 +15,5 @@ class EmailAuthBackend(BaseBackend):
             return None
         
     def get_user(self, user_id):
-        user_model = get_user_model()
-        try:
-            return user_model.objects.get(pk=user_id)
-        except user_model.DoesNotExist:
-            return None
+        # Сессии: пользователь из кэша процесса (см. users.authentication).
+        return get_cached_user(user_id)
@@ -0,0 +1,119 @@
+"""
+Чтение с реплики. Запросы на чтение моделей fonts_app внутри HTTP-запроса
+(PrimaryStickinessMiddleware) или блока replica_reads() идут в базу
+settings.DATABASE_REPLICA, если она описана в DATABASES; запись и все
+остальное - в default.
+
+Реплика отстает от основной базы, поэтому основную читают:
+- запросы с небезопасным методом (POST, PUT, PATCH, DELETE) целиком;
+- остаток запроса или блока после первой записи;
+- запросы клиента в течение DATABASE_STICKY_SECONDS после его записи
+  (по cookie), чтобы новый заказ сразу был виден в истории.
+
+Вне запросов и replica_reads() (Celery, команды, shell) все идет в default.
+"""
+
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_state = contextvars.ContextVar("db_routing", default=None)
+
+
+class RoutingState:
+    __slots__ = ("primary", "wrote")
+
+    def __init__(self, primary=False):
+        self.primary = primary
+        self.wrote = False
+
+
+def replica_configured():
+    return settings.DATABASE_REPLICA in connections
+
+
+@contextmanager
+def replica_reads(primary=False):
+    """Блок, в котором чтение fonts_app идет с реплики до первой записи."""
+    state = RoutingState(primary)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    route_app_labels = {"fonts_app"}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return None
+        if not replica_configured():
+            return None
+        state = _state.get()
+        if state is None or state.primary:
+            # Явно, а не None: иначе Django возьмет базу объекта из hints,
+            # и связанные с прочитанным на реплике объекты читались бы с нее.
+            return DEFAULT_DB_ALIAS
+        return settings.DATABASE_REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.primary = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия default, объекты из них можно связывать.
+        databases = {DEFAULT_DB_ALIAS, settings.DATABASE_REPLICA}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == settings.DATABASE_REPLICA:
+            return False
+        return None
+
+
+class PrimaryStickinessMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.needs_primary(request)) as state:
+            response = self.get_response(request)
+        return self.process_response(response, state)
+
+    async def __acall__(self, request):
+        with replica_reads(self.needs_primary(request)) as state:
+            response = await self.get_response(request)
+        return self.process_response(response, state)
+
+    def needs_primary(self, request):
+        return request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES
+
+    def process_response(self, response, state):
+        if state.wrote and replica_configured():
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=settings.DATABASE_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
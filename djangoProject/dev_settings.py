@@ -6,6 +6,9 @@ ALLOWED_HOSTS = ["*"]
 
 MEDIA_ROOT = BASE_DIR / "media_dev"
 STATIC_ROOT = BASE_DIR / "static_dev"
+CHARTS_ROOT = BASE_DIR / "charts_dev"
+
+NPLUSONE_ENABLED = True
 
 
 CORS_ALLOWED_ORIGINS = [
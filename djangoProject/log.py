@@ -0,0 +1,140 @@
+"""
+Логирование без блокировки потоков запросов. QueueLogHandler только
+подставляет аргументы в сообщение, вычищает секреты и кладет запись в
+очередь; JSON-форматирование и запись в поток или файл выполняет
+QueueListener в отдельном потоке. Если очередь переполнена, запись
+отбрасывается (счетчик dropped), а не ждет.
+
+Сообщения передаются с аргументами (logger.info("... %s", value)), а не
+f-строкой: ниже уровня логгера запись не создается и value не форматируется.
+
+События с большим потоком помечаются extra={"event": "<имя>"}, и для них
+в LOG_SAMPLE_RATES задается доля записей, которые попадут в лог. WARNING и
+выше пишутся всегда.
+"""
+
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+REDACTED = "[REDACTED]"
+# Заголовок и тело JWT начинаются с base64 от '{"'.
+_JWT = re.compile(r"eyJ[\w-]*\.[\w-]+\.[\w-]*")
+_SECRET_KEYS = re.compile(r"token|refresh|access|password|secret|authorization", re.I)
+
+# Атрибуты, которые есть у любой LogRecord; остальное - extra.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def redact(value):
+    """Заменяет JWT в строке, в том числе внутри dict, list и tuple."""
+    if isinstance(value, str):
+        return _JWT.sub(REDACTED, value)
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    filename=None пишет в stderr. sample_rates: {event: доля от 0 до 1}.
+
+    Секреты вычищаются из сообщения после подстановки args и из значений
+    extra (строк и вложенных dict, list, tuple); extra с именем вроде token
+    или password заменяется целиком. Объекты других типов попадают в JSON
+    через str() уже в потоке слушателя и не проверяются, как и текст
+    исключения из exc_info: токены в них не передавайте.
+    """
+
+    def __init__(self, filename=None, sample_rates=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.sample_rates = sample_rates or {}
+        self.dropped = 0
+        if filename:
+            target = WatchedFileHandler(filename, encoding="utf-8")
+        else:
+            target = logging.StreamHandler(sys.stderr)
+        target.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+        # uWSGI загружает приложение в master и форкает воркеры: поток
+        # слушателя в дочерний процесс не переходит, запускаем его заново.
+        os.register_at_fork(after_in_child=self._restart_listener)
+
+    def _restart_listener(self):
+        if self.listener._thread is not None:
+            self.listener._thread = None
+            self.listener.start()
+
+    def filter(self, record):
+        if not super().filter(record):
+            return False
+        rate = self.sample_rates.get(getattr(record, "event", None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+    def prepare(self, record):
+        # В отличие от QueueHandler.prepare, не форматируем запись здесь:
+        # только подставляем аргументы, чтобы в очередь не попали секреты.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key, value in list(vars(record).items()):
+            if key in _RECORD_ATTRS:
+                continue
+            if _SECRET_KEYS.search(key):
+                setattr(record, key, REDACTED)
+            else:
+                setattr(record, key, redact(value))
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Вызывается и из logging.shutdown() при выходе: дописываем очередь.
+        if self.listener._thread is not None:
+            self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        super().close()
+
+    def drain(self):
+        """Дожидается записи всего, что уже в очереди."""
+        self.listener.stop()
+        self.listener.start()
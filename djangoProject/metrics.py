@@ -0,0 +1,292 @@
+"""
+Метрики запросов: время ответа, число и время SQL-запросов, время
+сериализации (TimedSerializerMixin) и рендера ответа. Пишутся в гистограммы и отдаются в формате Prometheus на /metrics,
+а для каждого ответа дублируются в заголовке Server-Timing.
+
+Гистограммы без блокировок: каждый поток пишет в свой шард (dict в
+threading.local), при сборе шарды суммируются. Метрики у каждого процесса
+uWSGI свои, Prometheus должен опрашивать каждый воркер.
+"""
+
+import contextvars
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.module_loading import import_string
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # list.append атомарен под GIL, блокировка не нужна.
+            self._shards.append(shard)
+        return shard
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        shard = self._shard()
+        row = shard.get(key)
+        if row is None:
+            # Счетчики по корзинам (последняя = +Inf), затем сумма значений.
+            row = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def collect(self):
+        merged = {}
+        for shard in list(self._shards):
+            for key, row in list(shard.items()):
+                total = merged.setdefault(key, [0] * len(row))
+                for i, value in enumerate(row):
+                    total[i] += value
+        return merged
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, row in sorted(self.collect().items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in key]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += count
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            joined = ",".join(labels)
+            lines.append(f"{self.name}_sum{{{joined}}} {row[-1]}")
+            lines.append(f"{self.name}_count{{{joined}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Wall time of a request, from the first middleware to the response.",
+    SECONDS_BUCKETS,
+)
+DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in SQL queries per request.",
+    SECONDS_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Number of SQL queries per request.",
+    QUERY_BUCKETS,
+)
+SERIALIZE_DURATION = Histogram(
+    "http_response_serialize_duration_seconds",
+    "Time spent in DRF serializers (to_representation) per request.",
+    SECONDS_BUCKETS,
+)
+RENDER_DURATION = Histogram(
+    "http_response_render_duration_seconds",
+    "Time spent rendering template/DRF responses into bytes.",
+    SECONDS_BUCKETS,
+)
+HISTOGRAMS = [
+    REQUEST_DURATION,
+    DB_DURATION,
+    DB_QUERIES,
+    SERIALIZE_DURATION,
+    RENDER_DURATION,
+]
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """execute_wrapper на всех соединениях текущего потока."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+@asynccontextmanager
+async def awrap_queries(wrapper):
+    """
+    wrap_queries для async middleware. Соединения у каждого потока свои, а
+    под ASGI и async ORM, и sync view работают в потоке
+    sync_to_async(thread_sensitive=True), не в потоке event loop: обертки
+    ставятся и снимаются в нем.
+    """
+    stack = ExitStack()
+    await sync_to_async(stack.enter_context)(wrap_queries(wrapper))
+    try:
+        yield
+    finally:
+        await sync_to_async(stack.close)()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.serialize_time = None
+        self.serializing = False
+        self.render_started = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_queries += 1
+
+    def rendered(self, response):
+        self.render_time = time.perf_counter() - self.render_started
+
+
+class TimedSerializerMixin:
+    """
+    Время to_representation сериализатора (с вложенными) идет в метрику
+    serialize текущего запроса. Сериализаторы DRF выполняются во view, до
+    рендера ответа, поэтому render их не включает.
+    """
+
+    def to_representation(self, instance):
+        timings = _current_timings.get()
+        if timings is None or timings.serializing:
+            return super().to_representation(instance)
+        timings.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            elapsed = time.perf_counter() - started
+            timings.serialize_time = (timings.serialize_time or 0.0) + elapsed
+            timings.serializing = False
+
+
+class MetricsMiddleware:
+    """
+    Должен стоять первым в MIDDLEWARE, чтобы время включало остальные
+    middleware. Для потоковых ответов время тела ответа не учитывается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = request._timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            with wrap_queries(timings):
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = request._timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            async with awrap_queries(timings):
+                response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+
+        match = request.resolver_match
+        labels = {
+            "view": match.view_name if match else "<unresolved>",
+            "method": request.method,
+            "status": f"{response.status_code // 100}xx",
+        }
+        REQUEST_DURATION.observe(total, **labels)
+        DB_DURATION.observe(timings.db_time, **labels)
+        DB_QUERIES.observe(timings.db_queries, **labels)
+        if timings.serialize_time is not None:
+            SERIALIZE_DURATION.observe(timings.serialize_time, **labels)
+        if timings.render_time is not None:
+            RENDER_DURATION.observe(timings.render_time, **labels)
+
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = server_timing(timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Вызывается прямо перед render(): DRF Response тоже TemplateResponse.
+        timings = request._timings
+        timings.render_started = time.perf_counter()
+        response.add_post_render_callback(timings.rendered)
+        return response
+
+
+def server_timing(timings, total):
+    parts = [f'db;dur={timings.db_time * 1000:.2f};desc="{timings.db_queries} queries"']
+    if timings.serialize_time is not None:
+        parts.append(f"serialize;dur={timings.serialize_time * 1000:.2f}")
+    if timings.render_time is not None:
+        parts.append(f"render;dur={timings.render_time * 1000:.2f}")
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.expose()
+    for path in settings.METRICS_COLLECTORS:
+        for name, kind, documentation, value in import_string(path)():
+            lines += [
+                f"# HELP {name} {documentation}",
+                f"# TYPE {name} {kind}",
+                f"{name} {value}",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def metrics(request):
+    """
+    Метрики в формате Prometheus. С METRICS_TOKEN доступ по заголовку
+    Authorization: Bearer <token>, без него - только для is_staff.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        given = request.headers.get("Authorization", "").encode()
+        if not hmac.compare_digest(given, f"Bearer {token}".encode()):
+            return HttpResponseForbidden()
+    elif not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,136 @@
+"""
+Поиск N+1 запросов. За время запроса собираются «формы» SELECT-запросов
+(SQL без значений, списки IN (...) свернуты), и если одна форма повторилась
+NPLUSONE_THRESHOLD раз и больше, это N+1: запрос в цикле по объектам,
+обычно из-за не выбранных через select_related/prefetch_related связей.
+
+Место в коде (первый кадр стека из проекта, не из библиотек) снимается
+только на пороговом повторе, поэтому на остальные запросы детектор почти
+не тратит времени. Включается NPLUSONE_ENABLED (в dev и тестах), при
+NPLUSONE_RAISE ответ заменяется исключением NPlusOneError, иначе пишется
+предупреждение в лог djangoProject.nplusone.
+"""
+
+import logging
+import os
+import re
+import traceback
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import awrap_queries, wrap_queries
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+_SKIP_DIRS = ("site-packages", "dist-packages", f"{os.sep}.venv{os.sep}")
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    sql = _LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def caller_location():
+    """Ближайший к запросу кадр стека из кода проекта: 'путь:строка в функции'."""
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (
+            filename.startswith(base_dir)
+            and filename != __file__
+            and not any(part in filename for part in _SKIP_DIRS)
+        ):
+            path = os.path.relpath(filename, base_dir)
+            return f"{path}:{frame.lineno} in {frame.name}"
+    return "<unknown>"
+
+
+class QueryTracker:
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.counts = {}
+        self.locations = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == "SELECT":
+            key = fingerprint(sql)
+            count = self.counts[key] = self.counts.get(key, 0) + 1
+            if count == self.threshold:
+                self.locations[key] = caller_location()
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        """[(число повторов, место в коде, SQL)] по формам выше порога."""
+        return sorted(
+            (
+                (self.counts[key], location, key)
+                for key, location in self.locations.items()
+            ),
+            reverse=True,
+        )
+
+    def report(self, label):
+        problems = self.problems()
+        if not problems:
+            return
+        message = "\n".join(
+            [f"N+1 queries in {label}:"]
+            + [
+                f"  {count} x {location}: {sql[:300]}"
+                for count, location, sql in problems
+            ]
+        )
+        if settings.NPLUSONE_RAISE:
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+@contextmanager
+def detect_nplusone(label="block", threshold=None):
+    """Проверка произвольного участка кода (команды, задачи, тесты)."""
+    tracker = QueryTracker(threshold)
+    with wrap_queries(tracker):
+        yield tracker
+    tracker.report(label)
+
+
+class NPlusOneMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.NPLUSONE_ENABLED:
+            return self.get_response(request)
+
+        tracker = QueryTracker()
+        with wrap_queries(tracker):
+            response = self.get_response(request)
+        tracker.report(f"{request.method} {request.path}")
+        return response
+
+    async def __acall__(self, request):
+        if not settings.NPLUSONE_ENABLED:
+            return await self.get_response(request)
+
+        tracker = QueryTracker()
+        async with awrap_queries(tracker):
+            response = await self.get_response(request)
+        tracker.report(f"{request.method} {request.path}")
+        return response
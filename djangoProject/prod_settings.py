@@ -2,6 +2,9 @@ ALLOWED_HOSTS = ["fonts.unimatch.ru"]
 
 MEDIA_ROOT = "/vol/web/media"
 STATIC_ROOT = "/vol/web/static"
+CHARTS_ROOT = "/vol/web/charts"
+
+NPLUSONE_ENABLED = False
 
 CORS_ALLOWED_ORIGINS = [
     "https://fonts.unimatch.ru",
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -16,6 +17,8 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 
 DEBUG = os.getenv("DEBUG", "True") == "True"
 
+TESTING = sys.argv[1:2] == ["test"]
+
 ALLOWED_HOSTS = custom_settings.ALLOWED_HOSTS
 
 INSTALLED_APPS = [
@@ -35,6 +38,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "djangoProject.metrics.MetricsMiddleware",
+    "djangoProject.nplusone.NPlusOneMiddleware",
+    "djangoProject.db_router.PrimaryStickinessMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -67,6 +73,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "djangoProject.wsgi.application"
 
+# Пул соединений psycopg в каждом процессе, отдельный для каждой базы.
+# С пулом CONN_MAX_AGE должен оставаться 0.
+DB_POOL_OPTIONS = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 4)),
+    "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -75,9 +89,104 @@ DATABASES = {
         "USER": os.getenv("DB_USER"),
         "PASSWORD": os.getenv("DB_PASS"),
         "PORT": os.getenv("DB_PORT"),
+        "OPTIONS": {"pool": DB_POOL_OPTIONS},
     }
 }
 
+# Реплика для чтения каталога и заказов (djangoProject.db_router).
+# Без DB_REPLICA_HOST все запросы идут в default.
+DATABASE_REPLICA = "replica"
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES[DATABASE_REPLICA] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", os.getenv("DB_PORT")),
+        # В тестах реплика смотрит в тестовую базу default.
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["djangoProject.db_router.ReplicaRouter"]
+# Сколько секунд после записи клиент читает с основной базы.
+DATABASE_STICKY_SECONDS = int(os.getenv("DB_STICKY_SECONDS", 5))
+# Вторая база для тестов роутера: роутер читает с нее только в тестах,
+# которые подставляют ее в DATABASE_REPLICA.
+if TESTING:
+    DATABASES["test_replica"] = {"ENGINE": "django.db.backends.sqlite3"}
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "fonts",
+        },
+        "carts": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "fonts",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "carts": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "carts",
+            "OPTIONS": {"MAX_ENTRIES": 100_000},
+        },
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 60 * 60))
+
+# Логи в JSON через очередь (djangoProject.log): форматирование и запись в
+# отдельном потоке. LOG_FILE не задан - stderr. LOG_SAMPLE_RATES: доля
+# записей ниже WARNING для событий extra={"event": ...}.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE") or None
+LOG_SAMPLE_RATES = {"token_refresh": 0.1}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "queue": {
+            "()": "djangoProject.log.QueueLogHandler",
+            "filename": LOG_FILE,
+            "sample_rates": LOG_SAMPLE_RATES,
+        },
+    },
+    # LOG_LEVEL только для логгеров проекта: библиотеки на INFO и DEBUG
+    # слишком многословны и пишут без выборки.
+    "root": {"handlers": ["queue"], "level": "WARNING"},
+    "loggers": {
+        "django": {"handlers": ["queue"], "level": "WARNING", "propagate": False},
+        "djangoProject": {"level": LOG_LEVEL},
+        "fonts_app": {"level": LOG_LEVEL},
+        "users": {"level": LOG_LEVEL},
+    },
+}
+
+# Метрики запросов (djangoProject.metrics): заголовок Server-Timing и /metrics.
+SERVER_TIMING_HEADER = True
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_COLLECTORS = ["fonts_app.cache.catalog_cache_metrics"]
+
+# Анонимные корзины: fonts_app.service.CacheCartStorage (кэш "carts")
+# или fonts_app.service.ORMCartStorage (таблица Cart).
+GUEST_CART_STORAGE = "fonts_app.service.CacheCartStorage"
+GUEST_CART_TTL = 60 * 60 * 24 * 30
+
+# Без REDIS_URL брокер в памяти: задачи уходят только в воркер того же
+# процесса, для отдельного `celery worker` нужен Redis.
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL or "memory://")
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TIMEZONE = "UTC"
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -104,19 +213,46 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = custom_settings.MEDIA_ROOT
 STATIC_ROOT = custom_settings.STATIC_ROOT
 
+# Кеш графиков аналитики (fonts_app.charts): вне MEDIA_ROOT, отдается только через API.
+CHARTS_ROOT = custom_settings.CHARTS_ROOT
+CHARTS_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+CHARTS_CACHE_MAX_AGE = 60 * 60 * 24 * 30
+
+# Поиск N+1 запросов (djangoProject.nplusone): в dev и тестах, не в проде.
+# В тестах найденный N+1 роняет запрос исключением, в dev - только лог.
+NPLUSONE_ENABLED = custom_settings.NPLUSONE_ENABLED or TESTING
+NPLUSONE_RAISE = os.getenv("NPLUSONE_RAISE", str(TESTING)) == "True"
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", 5))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.CustomUser"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.BasicAuthentication",
+        "users.authentication.CachedBasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Кэш пользователей в каждом процессе (users.authentication): размер и срок жизни записи.
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 60
+# Кэш успешных проверок Basic-авторизации (HMAC логина и пароля, не сам пароль).
+BASIC_AUTH_CACHE_SIZE = 10000
+BASIC_AUTH_CACHE_TTL = 300
+# Сколько секунд помнить, что refresh-токена нет в черном списке (users.tokens).
+TOKEN_BLACKLIST_NEGATIVE_TTL = 60
+
+# Async-версии каталога и корзины (fonts_app.async_views), включает run_asgi.sh.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
+# Постраничная выдача по ключу включается параметрами ?page_size= / ?cursor=
+KEYSET_PAGE_SIZE = 50
+KEYSET_MAX_PAGE_SIZE = 500
+
 DJOSER = {
     "SERIALIZERS": {
         "user": "users.serializers.UserSerializer",
@@ -161,9 +297,9 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
     "TOKEN_OBTAIN_SERIALIZER": "users.serializers.EmailTokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.CachedTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
-    "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "users.serializers.CachedTokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
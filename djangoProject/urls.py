@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from fonts_app.views import csrf
+from djangoProject.metrics import metrics
 
 
 urlpatterns = [
@@ -10,6 +11,7 @@ urlpatterns = [
     path("", include("users.urls")),
     path("api/fonts/", include("fonts_app.urls")),
     path("api/csrf/", csrf),
+    path("metrics", metrics),
 ]
 
 if settings.DEBUG:
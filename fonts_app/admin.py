@@ -8,12 +8,31 @@ from .models import (
     Order,
     OrderItem,
     Cart,
+    UserOrderRollup,
+    ChartRenderJob,
 )
 
+
+class OrderAdmin(admin.ModelAdmin):
+    # __str__ заказа обращается к пользователю.
+    list_select_related = ["user"]
+
+
+class OrderItemAdmin(admin.ModelAdmin):
+    # __str__ позиции обходит заказ, пользователя и цену начертания.
+    list_select_related = [
+        "order__user",
+        "font_face_with_price__face__font",
+        "font_face_with_price__face__style",
+    ]
+
+
 admin.site.register(Font)
 admin.site.register(FontStyle)
 admin.site.register(FontFace)
 admin.site.register(FontFacePrice)
-admin.site.register(Order)
-admin.site.register(OrderItem)
+admin.site.register(Order, OrderAdmin)
+admin.site.register(OrderItem, OrderItemAdmin)
 admin.site.register(Cart)
+admin.site.register(UserOrderRollup)
+admin.site.register(ChartRenderJob)
@@ -0,0 +1,188 @@
+"""
+Аналитика заказов лицензий, посчитанная в БД: группировки по шрифту,
+типу лицензии, начертанию и месяцу и выручка считаются запросами
+values().annotate(...), без выгрузки строк в Python.
+"""
+
+import datetime
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import LicenseType, OrderItem, UserOrderRollup
+
+UTC = datetime.timezone.utc
+
+
+def ranked(counts):
+    """
+    Группы по убыванию количества, при равенстве - по имени. Порядок
+    задается в Python, чтобы не зависеть от сортировки строк в БД.
+    """
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+@dataclass
+class OrderAnalytics:
+    total_items: int = 0
+    revenue_total: Decimal = Decimal("0")
+    by_font: dict = field(default_factory=dict)
+    by_license: dict = field(default_factory=dict)
+    by_style: dict = field(default_factory=dict)
+    by_month: dict = field(default_factory=dict)
+    revenue_by_month: dict = field(default_factory=dict)
+
+    def as_response(self):
+        return {
+            "total_items": self.total_items,
+            "by_font": self.by_font,
+            "by_license": self.by_license,
+            "by_style": self.by_style,
+            "revenue_total": (
+                round(float(self.revenue_total), 2) if self.total_items else 0
+            ),
+        }
+
+
+class OrderItemAnalytics:
+    """Агрегаты по позициям заказов (OrderItem) с текущими ценами."""
+
+    font_field = "font_face_with_price__face__font__name"
+    style_field = "font_face_with_price__face__style__name"
+    license_field = "font_face_with_price__license_type"
+    month_field = "order__created_at"
+
+    def __init__(self, queryset=None):
+        if queryset is None:
+            queryset = OrderItem.objects.all()
+        self.queryset = queryset.filter(font_face_with_price__isnull=False)
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(OrderItem.objects.filter(order__user=user))
+
+    def count_expr(self):
+        return Count("pk")
+
+    def revenue_expr(self):
+        return Sum("font_face_with_price__price")
+
+    def month_expr(self):
+        # Месяц по UTC, как в прежнем расчете через pandas.
+        return TruncMonth(self.month_field, tzinfo=UTC)
+
+    def grouped(self, field):
+        rows = (
+            self.queryset.values(field)
+            .annotate(count=self.count_expr())
+            .order_by("-count", field)
+        )
+        return ranked({row[field]: row["count"] for row in rows})
+
+    def by_license(self):
+        license_map = dict(LicenseType.choices)
+        return ranked(
+            {
+                license_map.get(key, key): count
+                for key, count in self.grouped(self.license_field).items()
+            }
+        )
+
+    def monthly(self):
+        rows = (
+            self.queryset.annotate(month=self.month_expr())
+            .values("month")
+            .annotate(count=self.count_expr(), revenue=self.revenue_expr())
+            .order_by("month")
+        )
+        by_month = {}
+        revenue_by_month = {}
+        for row in rows:
+            month = row["month"].strftime("%Y-%m")
+            by_month[month] = row["count"]
+            revenue_by_month[month] = row["revenue"]
+        return by_month, revenue_by_month
+
+    def summary(self, months=False):
+        totals = self.queryset.aggregate(
+            total_items=self.count_expr(), revenue_total=self.revenue_expr()
+        )
+        result = OrderAnalytics(
+            total_items=totals["total_items"] or 0,
+            revenue_total=totals["revenue_total"] or Decimal("0"),
+            by_font=self.grouped(self.font_field),
+            by_license=self.by_license(),
+            by_style=self.grouped(self.style_field),
+        )
+        if months:
+            result.by_month, result.revenue_by_month = self.monthly()
+        return result
+
+
+class RollupAnalytics(OrderItemAnalytics):
+    """Те же агрегаты по предрасчитанным сводкам UserOrderRollup."""
+
+    font_field = "font__name"
+    style_field = "style__name"
+    license_field = "license_type"
+    month_field = "day"
+
+    def __init__(self, queryset=None):
+        if queryset is None:
+            queryset = UserOrderRollup.objects.all()
+        self.queryset = queryset
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(UserOrderRollup.objects.filter(user=user))
+
+    def count_expr(self):
+        return Sum("items_count")
+
+    def revenue_expr(self):
+        return Sum("revenue")
+
+    def month_expr(self):
+        return TruncMonth(self.month_field)
+
+
+def pandas_summary(queryset):
+    """
+    Прежний расчет через pandas: все строки выгружаются в DataFrame.
+    Оставлен как эталон для теста на совпадение и для бенчмарка.
+    """
+    import pandas as pd
+
+    qs = queryset.filter(font_face_with_price__isnull=False).values(
+        "order__created_at",
+        "font_face_with_price__license_type",
+        "font_face_with_price__price",
+        "font_face_with_price__face__font__name",
+        "font_face_with_price__face__style__name",
+    )
+    df = pd.DataFrame.from_records(qs)
+    if df.empty:
+        return OrderAnalytics()
+
+    license_map = dict(LicenseType.choices)
+    df["created_at"] = pd.to_datetime(df["order__created_at"], utc=True)
+    df["license_type_label"] = df["font_face_with_price__license_type"].map(license_map)
+    df["price"] = df["font_face_with_price__price"].astype(float)
+    df["font_name"] = df["font_face_with_price__face__font__name"].astype(str)
+    df["style_name"] = df["font_face_with_price__face__style__name"].astype(str)
+    df["month"] = df["created_at"].dt.tz_localize(None).dt.to_period("M").astype(str)
+
+    def grouped(column):
+        return ranked(df.groupby(column).size().to_dict())
+
+    return OrderAnalytics(
+        total_items=int(len(df)),
+        revenue_total=float(df["price"].sum()),
+        by_font=grouped("font_name"),
+        by_license=grouped("license_type_label"),
+        by_style=grouped("style_name"),
+        by_month=df.groupby("month").size().sort_index().to_dict(),
+        revenue_by_month=df.groupby("month")["price"].sum().sort_index().to_dict(),
+    )
@@ -0,0 +1,121 @@
+"""
+Async-версии чтения каталога и корзины для запуска под ASGI (run_asgi.sh,
+ASYNC_VIEWS=True). Запросы к БД идут через async ORM (afirst, async for),
+поэтому пока запрос ждет БД или кэш, тот же процесс обслуживает другие.
+
+Ответы совпадают с DRF-версиями из views.py: queryset, сериализатор и
+пагинация берутся у них же, кэш каталога общий.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.views import View
+from djangoProject.db_router import replica_reads
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.request import Request
+
+from users.authentication import CachedBasicAuthentication, StatelessJWTAuthentication
+
+from .cache import CATALOG_HITS_KEY, CATALOG_MISSES_KEY, _aincr, acatalog_cache_key
+from .service import CartService
+from .views import (
+    AllFontsView,
+    AllLicensesView,
+    CartView,
+    GetFontLicensesView,
+    GetLicensesByStyleView,
+)
+
+
+async def aget_user(request):
+    """
+    Пользователь в порядке DEFAULT_AUTHENTICATION_CLASSES: Basic, сессия,
+    JWT (по claims, без запроса к БД, как у CartView).
+    """
+    if request.headers.get("Authorization", "").startswith("Basic "):
+        # Проверка пароля - работа для CPU, в отдельном потоке.
+        authenticate = CachedBasicAuthentication().authenticate
+        result = await sync_to_async(authenticate)(Request(request))
+        return result[0] if result else AnonymousUser()
+
+    user = await request.auser()
+    if user.is_authenticated and user.is_active:
+        return user
+
+    result = await StatelessJWTAuthentication().aauthenticate(request)
+    return result[0] if result else AnonymousUser()
+
+
+class AsyncCatalogView(View):
+    """Список каталога из sync_view с тем же кэшем, что у CatalogCacheMixin."""
+
+    sync_view = None
+
+    def get_sync_view(self):
+        return self.sync_view(request=self.request, args=self.args, kwargs=self.kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        key = await acatalog_cache_key(request)
+        data = await cache.aget(key)
+        if data is not None:
+            await _aincr(CATALOG_HITS_KEY)
+            return JsonResponse(data, safe=False, headers={"X-Cache": "HIT"})
+
+        await _aincr(CATALOG_MISSES_KEY)
+        try:
+            # С основной базы, как в CatalogCacheMixin.
+            with replica_reads(primary=True):
+                data = await self.alist(Request(request))
+        except NotFound as e:
+            return JsonResponse({"detail": str(e.detail)}, status=404)
+        await cache.aset(key, data, settings.CATALOG_CACHE_TIMEOUT)
+        return JsonResponse(data, safe=False, headers={"X-Cache": "MISS"})
+
+    async def alist(self, request):
+        view = self.get_sync_view()
+        queryset = view.get_queryset()
+        if view.pagination_class is not None:
+            paginator = view.pagination_class()
+            page = await paginator.apaginate_queryset(queryset, request, view=view)
+            if page is not None:
+                return paginator.get_paginated_data(self.serialize(view, page, request))
+        return self.serialize(view, [obj async for obj in queryset], request)
+
+    def serialize(self, view, objects, request):
+        return view.serializer_class(
+            objects, many=True, context={"request": request, "view": view}
+        ).data
+
+
+class AsyncAllFontsView(AsyncCatalogView):
+    sync_view = AllFontsView
+
+
+class AsyncAllLicensesView(AsyncCatalogView):
+    sync_view = AllLicensesView
+
+
+class AsyncGetFontLicensesView(AsyncCatalogView):
+    sync_view = GetFontLicensesView
+
+
+class AsyncGetLicensesByStyleView(AsyncCatalogView):
+    sync_view = GetLicensesByStyleView
+
+
+class AsyncCartView(View):
+    serializer_class = CartView.serializer_class
+
+    async def get(self, request):
+        try:
+            user = await aget_user(request)
+        except AuthenticationFailed as e:
+            # Тело как у exception_handler DRF.
+            data = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+            return JsonResponse(data, status=401)
+
+        cart = await CartService.aget_cart_object(request, user, with_items=True)
+        return JsonResponse(self.serializer_class(cart).data)
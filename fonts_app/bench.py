@@ -0,0 +1,148 @@
+"""Общие утилиты для команд-бенчмарков: генерация данных и замеры времени."""
+
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .models import (
+    Cart,
+    Font,
+    FontStyle,
+    FontFace,
+    FontFacePrice,
+    LicenseType,
+    Order,
+    OrderItem,
+)
+
+BATCH_SIZE = 5000
+
+
+def seed_catalog(fonts, styles, prefix="Bench"):
+    style_objs = FontStyle.objects.bulk_create(
+        [FontStyle(name=f"{prefix} Style {i}") for i in range(styles)]
+    )
+    font_objs = Font.objects.bulk_create(
+        [
+            Font(name=f"{prefix} Font {i}", author=f"{prefix} Author", desc="-")
+            for i in range(fonts)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    faces = FontFace.objects.bulk_create(
+        [
+            FontFace(font=font, style=style)
+            for font in font_objs
+            for style in style_objs
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return FontFacePrice.objects.bulk_create(
+        [
+            FontFacePrice(
+                face=face,
+                license_type=license_type,
+                price=Decimal(random.randint(5, 500) * 100),
+            )
+            for face in faces
+            for license_type in LicenseType.values
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+@contextmanager
+def explicit_created_at():
+    """Позволяет задавать Order.created_at вручную (auto_now_add его затирает)."""
+    field = Order._meta.get_field("created_at")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed_orders(users, orders_per_user, prices, items_per_order=3, days=730):
+    now = timezone.now()
+    with explicit_created_at():
+        orders = Order.objects.bulk_create(
+            [
+                Order(
+                    user=user,
+                    created_at=now - timedelta(minutes=random.randint(0, days * 1440)),
+                )
+                for user in users
+                for _ in range(orders_per_user)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    items_per_order = min(items_per_order, len(prices))
+    OrderItem.objects.bulk_create(
+        (
+            OrderItem(order=order, font_face_with_price=price)
+            for order in orders
+            for price in random.sample(prices, items_per_order)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return orders
+
+
+def seed_users(count, prefix="bench"):
+    # Вход под этими пользователями не нужен, пароль заведомо неиспользуемый.
+    password = make_password(None)
+    User = get_user_model()
+    return User.objects.bulk_create(
+        [
+            User(
+                username=f"{prefix}-{i}",
+                email=f"{prefix}-{i}@example.com",
+                password=password,
+            )
+            for i in range(count)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def seed_carts(users, prices, items_per_cart=5):
+    items_per_cart = min(items_per_cart, len(prices))
+    contents = [random.sample(prices, items_per_cart) for _ in users]
+    carts = Cart.objects.bulk_create(
+        [
+            Cart(user=user, sum=sum(price.price for price in items))
+            for user, items in zip(users, contents)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    Cart.items.through.objects.bulk_create(
+        (
+            Cart.items.through(cart_id=cart.pk, fontfaceprice_id=price.pk)
+            for cart, items in zip(carts, contents)
+            for price in items
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return carts
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, round(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
@@ -0,0 +1,114 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from djangoProject.db_router import replica_reads
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_HITS_KEY = "catalog:stats:hits"
+CATALOG_MISSES_KEY = "catalog:stats:misses"
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+async def _aincr(key):
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, timeout=None)
+        return await cache.aincr(key)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Начинаем с метки времени, а не с 1: если ключ версии вытеснят из
+        # кэша, старые ответы не совпадут с новой версией.
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        return get_catalog_version()
+
+
+def catalog_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"catalog:v{get_catalog_version()}:{path}"
+
+
+async def acatalog_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"catalog:v{await aget_catalog_version()}:{path}"
+
+
+def catalog_cache_stats():
+    hits = cache.get(CATALOG_HITS_KEY, 0)
+    misses = cache.get(CATALOG_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "version": get_catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def catalog_cache_metrics():
+    """Статистика кэша каталога для /metrics (см. METRICS_COLLECTORS)."""
+    stats = catalog_cache_stats()
+    return [
+        ("catalog_cache_hits_total", "counter", "Catalog cache hits.", stats["hits"]),
+        (
+            "catalog_cache_misses_total",
+            "counter",
+            "Catalog cache misses.",
+            stats["misses"],
+        ),
+    ]
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует сериализованный ответ списка каталога в общем для всех
+    воркеров кэше. Ключ содержит версию каталога, которая растет при
+    любом изменении шрифтов, начертаний и цен (см. fonts_app.signals).
+
+    Промах читается с основной базы, а не с реплики: иначе отстающая
+    реплика положила бы под новую версию старые строки на весь
+    CATALOG_CACHE_TIMEOUT.
+    """
+
+    def list(self, request, *args, **kwargs):
+        key = catalog_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _incr(CATALOG_HITS_KEY)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        _incr(CATALOG_MISSES_KEY)
+        with replica_reads(primary=True):
+            response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        response["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,305 @@
+"""
+Графики аналитики заказов. Функции чистые: на вход сводка OrderAnalytics,
+на выход PNG/SVG-файлы, без обращений к БД. Поэтому их можно вызывать в
+дочерних процессах ProcessPoolExecutor и в задачах Celery.
+
+Отрисованные графики лежат в out_dir/objects/<sha256>.<png|svg>, где хеш
+считается по данным и параметрам отрисовки. Если такой файл уже есть,
+график не перерисовывается, а user_<id>_<chart>.png просто указывает на него.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter, namedtuple
+from decimal import Decimal
+from pathlib import Path
+
+from .analytics import OrderAnalytics, ranked
+from .models import LicenseType
+
+UTC = datetime.timezone.utc
+
+# Меняйте при любом изменении оформления графиков: старые файлы перестанут
+# совпадать по хешу и будут перерисованы.
+RENDER_VERSION = 1
+DPI = 160
+OBJECTS_DIR = "objects"
+FORMATS = ("png", "svg")
+MANIFEST_NAME = "manifest.json"
+
+ChartFile = namedtuple("ChartFile", ["path", "key", "rendered"])
+
+# Поля строки, которую ожидает summarize_rows().
+ROW_FIELDS = (
+    "order__created_at",
+    "font_face_with_price__license_type",
+    "font_face_with_price__price",
+    "font_face_with_price__face__font__name",
+    "font_face_with_price__face__style__name",
+)
+
+
+def summarize_rows(rows):
+    """Сводка по строкам позиций заказов одного пользователя (см. ROW_FIELDS)."""
+    license_map = dict(LicenseType.choices)
+    by_font = Counter()
+    by_license = Counter()
+    by_style = Counter()
+    by_month = Counter()
+    revenue_by_month = {}
+    total_items = 0
+    revenue_total = Decimal("0")
+
+    for created_at, license_type, price, font_name, style_name in rows:
+        month = created_at.astimezone(UTC).strftime("%Y-%m")
+        total_items += 1
+        revenue_total += price
+        by_font[font_name] += 1
+        by_license[license_map.get(license_type, license_type)] += 1
+        by_style[style_name] += 1
+        by_month[month] += 1
+        revenue_by_month[month] = revenue_by_month.get(month, Decimal("0")) + price
+
+    return OrderAnalytics(
+        total_items=total_items,
+        revenue_total=revenue_total,
+        by_font=ranked(by_font),
+        by_license=ranked(by_license),
+        by_style=ranked(by_style),
+        by_month=dict(sorted(by_month.items())),
+        revenue_by_month=dict(sorted(revenue_by_month.items())),
+    )
+
+
+def top_n_with_other(series, top_n):
+    items = sorted(series.items(), key=lambda item: item[1], reverse=True)
+    if len(items) <= top_n:
+        return dict(items)
+    head = dict(items[:top_n])
+    head["Other"] = sum(value for _, value in items[top_n:])
+    return head
+
+
+def chart_specs(analytics, top_n):
+    """(суффикс файла, тип, заголовок, подпись оси X, подпись оси Y, данные)."""
+    revenue_by_month = {
+        month: float(value) for month, value in analytics.revenue_by_month.items()
+    }
+    return [
+        (
+            "by_font",
+            "bar",
+            "Licenses count by font",
+            "Font",
+            "Count",
+            top_n_with_other(analytics.by_font, top_n),
+        ),
+        (
+            "by_license",
+            "pie",
+            "Licenses count by license type",
+            None,
+            None,
+            analytics.by_license,
+        ),
+        (
+            "by_style",
+            "bar",
+            "Licenses count by style",
+            "Style",
+            "Count",
+            top_n_with_other(analytics.by_style, top_n),
+        ),
+        (
+            "by_month",
+            "line",
+            "Licenses count by month",
+            "Month",
+            "Count",
+            analytics.by_month,
+        ),
+        (
+            "revenue_by_month",
+            "line",
+            "Revenue by month",
+            "Month",
+            "Revenue",
+            revenue_by_month,
+        ),
+    ]
+
+
+def render_chart(path, kind, title, xlabel, ylabel, data, fmt="png"):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    labels = list(data.keys())
+    values = list(data.values())
+    if kind == "pie":
+        fig = plt.figure(figsize=(10, 6))
+    elif kind == "line":
+        fig = plt.figure(figsize=(12, 5))
+    else:
+        fig = plt.figure(figsize=(12, 6))
+    try:
+        ax = fig.add_subplot(111)
+        if kind == "pie":
+            ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=90)
+        elif kind == "line":
+            ax.plot(labels, values, marker="o")
+        else:
+            ax.bar(labels, values)
+        ax.set_title(title)
+        if kind != "pie":
+            ax.set_xlabel(xlabel)
+            ax.set_ylabel(ylabel)
+            ax.tick_params(axis="x", rotation=45, labelsize=9)
+        fig.tight_layout()
+        fig.savefig(path, dpi=DPI, format=fmt)
+    finally:
+        # Без явного close pyplot держит все фигуры до конца процесса.
+        plt.close(fig)
+    return path
+
+
+def chart_key(kind, title, xlabel, ylabel, data, fmt="png"):
+    payload = [
+        RENDER_VERSION,
+        DPI,
+        fmt,
+        kind,
+        title,
+        xlabel,
+        ylabel,
+        [[str(label), str(value)] for label, value in data.items()],
+    ]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+def chart_object_path(out_dir, key, fmt="png"):
+    return Path(out_dir) / OBJECTS_DIR / f"{key}.{fmt}"
+
+
+def _link(link_path, target):
+    """Атомарно заменяет link_path симлинком на target (или копией, если нельзя)."""
+    tmp_path = link_path.with_name(f".{link_path.name}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.symlink(os.path.relpath(target, link_path.parent), tmp_path)
+    except OSError:
+        shutil.copyfile(target, tmp_path)
+    os.replace(tmp_path, link_path)
+
+
+def cached_chart(out_dir, kind, title, xlabel, ylabel, data, fmt="png"):
+    key = chart_key(kind, title, xlabel, ylabel, data, fmt)
+    target = chart_object_path(out_dir, key, fmt)
+
+    rendered = not target.exists()
+    if rendered:
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{key}.")
+        os.close(fd)
+        try:
+            render_chart(tmp_name, kind, title, xlabel, ylabel, data, fmt)
+            os.replace(tmp_name, target)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+    else:
+        # mtime = время последнего использования, по нему работает вытеснение.
+        os.utime(target)
+    return ChartFile(target, key, rendered)
+
+
+def render_charts(analytics, out_dir, top_n=12, fmt="png"):
+    """Все графики сводки в кеше out_dir/objects: {имя графика: ChartFile}."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+    (Path(out_dir) / OBJECTS_DIR).mkdir(parents=True, exist_ok=True)
+    return {
+        name: cached_chart(out_dir, kind, title, xlabel, ylabel, data, fmt)
+        for name, kind, title, xlabel, ylabel, data in chart_specs(analytics, top_n)
+    }
+
+
+def render_user_charts(analytics, out_dir, prefix, top_n=12):
+    """Графики с постоянными именами <prefix>_<график>.png — ссылками в кеш."""
+    out_dir = Path(out_dir)
+    charts = []
+    for name, chart in render_charts(analytics, out_dir, top_n).items():
+        link_path = out_dir / f"{prefix}_{name}.png"
+        _link(link_path, chart.path)
+        charts.append(chart._replace(path=link_path))
+    return charts
+
+
+def load_manifest(out_dir):
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_manifest(out_dir, manifest):
+    path = Path(out_dir) / MANIFEST_NAME
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def evict_charts(out_dir, max_bytes=None, max_age=None, keep=()):
+    """
+    Удаляет из objects/ графики, к которым не обращались дольше max_age
+    секунд, затем самые давно использованные, пока объем больше max_bytes.
+    Ключи из keep не трогаются. Симлинки и записи манифеста на удаленные
+    графики тоже удаляются. Возвращает множество удаленных ключей.
+    """
+    out_dir = Path(out_dir)
+    objects_dir = out_dir / OBJECTS_DIR
+    if not objects_dir.exists():
+        return set()
+
+    now = time.time()
+    objects = []
+    for path in objects_dir.iterdir():
+        if path.suffix[1:] not in FORMATS:
+            continue
+        stat = path.stat()
+        objects.append((stat.st_mtime, stat.st_size, path))
+    objects.sort()
+
+    total = sum(size for _, size, _ in objects)
+    removed = set()
+    for mtime, size, path in objects:
+        expired = max_age is not None and now - mtime > max_age
+        oversized = max_bytes is not None and total > max_bytes
+        if not (expired or oversized) or path.stem in keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        removed.add(path.stem)
+
+    if removed:
+        for link in out_dir.iterdir():
+            if link.is_symlink() and not link.exists():
+                link.unlink()
+        manifest = load_manifest(out_dir)
+        for charts in manifest.values():
+            for name in [name for name, key in charts.items() if key in removed]:
+                del charts[name]
+        save_manifest(
+            out_dir, {user: charts for user, charts in manifest.items() if charts}
+        )
+    return removed
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fonts_app.bench import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark throughput of a running server under many concurrent slow "
+        "clients. Each client trickles its request over --slow-ms and reads the "
+        "response; pass several --url values to compare e.g. uWSGI and ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            action="append",
+            required=True,
+            help="Full URL, e.g. http://127.0.0.1:8001/api/fonts/all-fonts/.",
+        )
+        parser.add_argument("--clients", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument(
+            "--slow-ms",
+            type=int,
+            default=200,
+            help="Time each client spends sending its request headers.",
+        )
+        parser.add_argument(
+            "--header",
+            action="append",
+            default=[],
+            help='Extra request header, e.g. "Authorization: Bearer <token>".',
+        )
+        parser.add_argument("--timeout", type=float, default=60.0)
+
+    def handle(self, *args: Any, **options: Any):
+        self.options = options
+        self.stdout.write(
+            f"clients: {options['clients']}, requests: {options['requests']}, "
+            f"slow: {options['slow_ms']} ms"
+        )
+        self.stdout.write(
+            f"{'url':<50}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+        )
+        for url in options["url"]:
+            parts = urlsplit(url)
+            if parts.scheme != "http" or not parts.hostname:
+                raise CommandError(f"Only http:// URLs are supported: {url}")
+            elapsed, timings, errors = asyncio.run(self.run(parts))
+            ok = timings or [0.0]
+            self.stdout.write(
+                f"{url:<50}{len(timings) / elapsed:>10.1f}"
+                f"{percentile(ok, 50):>10.1f}{percentile(ok, 99):>10.1f}{errors:>8}"
+            )
+
+    async def run(self, parts):
+        remaining = self.options["requests"]
+        timings = []
+        errors = 0
+
+        async def client():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(
+                        self.request(parts), self.options["timeout"]
+                    )
+                except (OSError, asyncio.TimeoutError):
+                    status = None
+                if status == 200:
+                    timings.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(self.options["clients"])))
+        return time.perf_counter() - started, timings, errors
+
+    async def request(self, parts):
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            path = parts.path or "/"
+            if parts.query:
+                path = f"{path}?{parts.query}"
+            lines = [
+                f"GET {path} HTTP/1.1",
+                f"Host: {parts.netloc}",
+                "Connection: close",
+                *self.options["header"],
+            ]
+            # Медленный клиент: заголовки уходят по строке с паузами.
+            pause = self.options["slow_ms"] / 1000 / len(lines)
+            for line in lines:
+                writer.write(f"{line}\r\n".encode())
+                await writer.drain()
+                if pause:
+                    await asyncio.sleep(pause)
+            writer.write(b"\r\n")
+            await writer.drain()
+
+            status_line = await reader.readline()
+            await reader.read()
+            try:
+                return int(status_line.split()[1])
+            except (IndexError, ValueError):
+                return None
+        finally:
+            writer.close()
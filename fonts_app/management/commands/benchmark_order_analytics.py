@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from fonts_app.analytics import OrderItemAnalytics, RollupAnalytics, pandas_summary
+from fonts_app.bench import measure, percentile, seed_catalog, seed_orders
+from fonts_app.models import OrderItem
+from fonts_app.service import OrderRollupService
+
+ITEMS_PER_ORDER = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark order analytics: pandas over all rows vs SQL aggregation "
+        "vs rollup tables. Seeded rows are rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="Number of order items to seed for one user per run.",
+        )
+        parser.add_argument("--fonts", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args: Any, **options: Any):
+        self.stdout.write(
+            f"{'items':>10}{'pandas ms':>14}{'sql ms':>12}{'rollup ms':>12}"
+        )
+        for size in options["sizes"]:
+            with transaction.atomic():
+                self.run(size, options["fonts"], options["repeat"])
+                transaction.set_rollback(True)
+
+    def run(self, size, fonts, repeat):
+        prices = seed_catalog(fonts, 4)
+        user = get_user_model().objects.create(
+            username="bench-analytics", email="bench-analytics@example.com"
+        )
+        seed_orders(
+            [user],
+            max(1, size // ITEMS_PER_ORDER),
+            prices,
+            items_per_order=ITEMS_PER_ORDER,
+        )
+        OrderRollupService.rebuild(user_id=user.pk)
+
+        items = OrderItem.objects.filter(order__user=user)
+        pandas_ms = percentile(measure(lambda: pandas_summary(items), repeat), 50)
+        sql_ms = percentile(
+            measure(lambda: OrderItemAnalytics(items).summary(months=True), repeat),
+            50,
+        )
+        rollup_ms = percentile(
+            measure(
+                lambda: RollupAnalytics.for_user(user).summary(months=True), repeat
+            ),
+            50,
+        )
+        self.stdout.write(
+            f"{items.count():>10}{pandas_ms:>14.1f}{sql_ms:>12.1f}{rollup_ms:>12.1f}"
+        )
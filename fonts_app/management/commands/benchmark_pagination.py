@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from fonts_app.bench import measure, percentile, seed_catalog, seed_orders
+from fonts_app.models import FontFacePrice, Order
+from fonts_app.pagination import CatalogPagination, OrderPagination
+from fonts_app.serializers import FontFacePriceSerializer, OrderSerializer
+
+STYLES = 2
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark keyset vs offset pagination of the catalog and order history "
+        "at growing table sizes. Seeded rows are rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1_000, 10_000, 100_000],
+            help="Number of FontFacePrice rows and of orders to seed per run.",
+        )
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args: Any, **options: Any):
+        self.page_size = options["page_size"]
+        self.repeat = options["repeat"]
+        self.factory = APIRequestFactory()
+
+        self.stdout.write(
+            f"{'table':<8}{'rows':>10}{'page':>8}{'keyset p50 ms':>16}{'offset p50 ms':>16}"
+        )
+        for size in options["sizes"]:
+            with transaction.atomic():
+                self.run(size)
+                transaction.set_rollback(True)
+
+    def run(self, size):
+        fonts = max(1, size // (STYLES * 7))
+        prices = seed_catalog(fonts, STYLES)
+        user = get_user_model().objects.create(
+            username="bench-pagination", email="bench-pagination@example.com"
+        )
+        seed_orders([user], size, prices, items_per_order=1)
+
+        catalog = FontFacePrice.objects.select_related("face__font", "face__style")
+        orders = Order.objects.filter(user=user).prefetch_related(
+            "items__font_face_with_price__face__font",
+            "items__font_face_with_price__face__style",
+        )
+        self.report("catalog", catalog, CatalogPagination, FontFacePriceSerializer)
+        self.report("orders", orders, OrderPagination, OrderSerializer)
+
+    def report(self, name, queryset, pagination_class, serializer_class):
+        total = queryset.count()
+        ordered = queryset.order_by(*pagination_class.ordering)
+        for label, offset in (
+            ("first", 0),
+            ("middle", total // 2),
+            ("last", max(0, total - self.page_size)),
+        ):
+            paginator = pagination_class()
+            paginator.model = queryset.model
+            params = {"page_size": self.page_size}
+            if offset:
+                anchor = ordered[offset - 1]
+                params["cursor"] = paginator.encode_cursor(
+                    paginator.get_position(anchor)
+                )
+            request = Request(self.factory.get("/", params))
+
+            def keyset():
+                page = pagination_class().paginate_queryset(queryset, request)
+                return serializer_class(page, many=True).data
+
+            def offset_page():
+                page = ordered[offset : offset + self.page_size]
+                return serializer_class(page, many=True).data
+
+            keyset_ms = percentile(measure(keyset, self.repeat), 50)
+            offset_ms = percentile(measure(offset_page, self.repeat), 50)
+            self.stdout.write(
+                f"{name:<8}{total:>10}{label:>8}{keyset_ms:>16.2f}{offset_ms:>16.2f}"
+            )
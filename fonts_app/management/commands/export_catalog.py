@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import brotli
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from fonts_app.models import Font, FontFacePrice
+from fonts_app.serializers import FontSerializer, FontFacePriceSerializer
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def _write_variants(path: Path, data: bytes) -> None:
+    # nginx: gzip_static / brotli_static ищут file.gz и file.br рядом с file.
+    _write_atomic(path, data)
+    _write_atomic(path.with_name(path.name + ".gz"), gzip.compress(data, 9, mtime=0))
+    _write_atomic(path.with_name(path.name + ".br"), brotli.compress(data, quality=11))
+
+
+def _remove_variants(path: Path) -> None:
+    for suffix in ("", ".gz", ".br"):
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the catalog (all-fonts, all-licenses, get-license/<pk_font>) "
+        "as static JSON files with gzip and brotli variants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--out-dir",
+            type=str,
+            default=None,
+            help="Defaults to MEDIA_ROOT/catalog.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-export every font, ignoring the previous manifest.",
+        )
+
+    def handle(self, *args: Any, **options: Any):
+        out_dir = Path(options["out_dir"] or Path(settings.MEDIA_ROOT) / "catalog")
+        manifest_path = out_dir / "manifest.json"
+        renderer = JSONRenderer()
+
+        manifest = None
+        if manifest_path.exists() and not options["full"]:
+            manifest = json.loads(manifest_path.read_text())
+
+        started_at = timezone.now()
+        font_ids = set(Font.objects.values_list("pk", flat=True))
+
+        if manifest is None:
+            touched = font_ids
+            removed = set()
+        else:
+            since = datetime.fromisoformat(manifest["exported_at"])
+            touched = set(
+                Font.objects.filter(updated_at__gt=since).values_list("pk", flat=True)
+            )
+            removed = set(manifest["fonts"]) - font_ids
+
+        if manifest is not None and not touched and not removed:
+            self.stdout.write("Catalog is up to date. Nothing to export.")
+            return
+
+        fonts = FontSerializer(Font.objects.all(), many=True).data
+        _write_variants(out_dir / "all-fonts.json", renderer.render(fonts))
+
+        prices = list(FontFacePrice.objects.select_related("face__font", "face__style"))
+        licenses = FontFacePriceSerializer(prices, many=True).data
+        _write_variants(out_dir / "all-licenses.json", renderer.render(licenses))
+
+        by_font = defaultdict(list)
+        for price, item in zip(prices, licenses):
+            if price.face.font_id in touched:
+                by_font[price.face.font_id].append(item)
+
+        for font_id in touched:
+            _write_variants(
+                out_dir / "get-license" / f"{font_id}.json",
+                renderer.render(by_font[font_id]),
+            )
+
+        for font_id in removed:
+            _remove_variants(out_dir / "get-license" / f"{font_id}.json")
+
+        _write_atomic(
+            manifest_path,
+            json.dumps(
+                {"exported_at": started_at.isoformat(), "fonts": sorted(font_ids)}
+            ).encode(),
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Catalog exported to {out_dir}"))
+        self.stdout.write(f"  fonts exported: {len(touched)}")
+        self.stdout.write(f"  fonts removed: {len(removed)}")
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fonts_app.service import OrderExportService
+
+
+def _date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every order item as CSV or NDJSON (to stdout or --output) "
+        "using a server-side cursor; memory does not grow with the row count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--date-from", type=_date, help="YYYY-MM-DD, UTC")
+        parser.add_argument("--date-to", type=_date, help="YYYY-MM-DD, UTC")
+        parser.add_argument("--output", type=str, default=None)
+        parser.add_argument(
+            "--chunk-size", type=int, default=OrderExportService.chunk_size
+        )
+
+    def handle(self, *args: Any, **options: Any):
+        date_from, date_to = options["date_from"], options["date_to"]
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--date-from is after --date-to")
+
+        lines = OrderExportService.lines(
+            options["format"], date_from, date_to, options["chunk_size"]
+        )
+        if options["output"] is None:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as fh:
+            fh.writelines(lines)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from fonts_app.models import Cart
+from fonts_app.service import CartService
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge carts of users who have more than one into a single cart. "
+        "Run before migrate: the uniq_cart_user constraint fails on duplicates."
+    )
+
+    def handle(self, *args: Any, **options: Any):
+        if Cart._meta.db_table not in connection.introspection.table_names():
+            self.stdout.write("No cart table yet, nothing to merge.")
+            return
+        deleted = CartService.merge_duplicate_user_carts()
+        self.stdout.write(self.style.SUCCESS(f"Duplicate carts merged: {deleted}"))
@@ -1,165 +1,194 @@
 from __future__ import annotations
 
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
 from typing import Any
 
-import pandas as pd
-import matplotlib.pyplot as plt
-
+import django
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
-from django.utils import timezone
 
-from fonts_app.models import OrderItem, LicenseType
+from fonts_app.analytics import OrderItemAnalytics
+from fonts_app.charts import (
+    ROW_FIELDS,
+    evict_charts,
+    load_manifest,
+    render_user_charts,
+    save_manifest,
+    summarize_rows,
+)
+from fonts_app.models import OrderItem
+
+CHUNK_SIZE = 5000
 
 
-def _top_n_with_other(series: pd.Series, top_n: int) -> pd.Series:
-    series = series.sort_values(ascending=False)
-    if len(series) <= top_n:
-        return series
-    head = series.iloc[:top_n]
-    other_sum = series.iloc[top_n:].sum()
-    head.loc["Other"] = other_sum
-    return head
+def _render(job):
+    user_id, analytics, out_dir, prefix, top_n = job
+    return user_id, analytics, render_user_charts(analytics, out_dir, prefix, top_n)
 
 
 class Command(BaseCommand):
-    help = "Build matplotlib charts for user orders analytics (fonts licenses)."
+    help = (
+        "Build matplotlib charts for user orders analytics (fonts licenses). "
+        "With --all-users/--user-ids order items are streamed in one query "
+        "and charts are rendered in a process pool. Charts are cached by "
+        "content hash: unchanged charts are linked, not re-rendered."
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("--user-id", type=int, required=True)
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument("--user-id", type=int)
+        target.add_argument("--user-ids", type=int, nargs="+")
+        target.add_argument("--all-users", action="store_true")
         parser.add_argument("--out-dir", type=str, default="analytics_plots")
         parser.add_argument("--top-n", type=int, default=12)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Render processes for batch mode; 1 renders in this process.",
+        )
+        parser.add_argument(
+            "--cache-max-mb",
+            type=float,
+            default=1024,
+            help="Evict least recently used charts above this size.",
+        )
+        parser.add_argument(
+            "--cache-max-age-days",
+            type=float,
+            default=30,
+            help="Evict charts not used for this many days.",
+        )
 
     def handle(self, *args: Any, **options: Any):
-        user_id: int = options["user_id"]
-        out_dir = Path(options["out_dir"]).resolve()
-        top_n: int = options["top_n"]
+        self.out_dir = Path(options["out_dir"]).resolve()
+        self.top_n: int = options["top_n"]
+        self.verbosity: int = options["verbosity"]
+        self.manifest = load_manifest(self.out_dir)
+        self.used_keys = set()
+        self.rendered = self.reused = 0
+
+        if options["user_id"] is not None:
+            self.plot_user(options["user_id"])
+        else:
+            self.plot_batch(options["user_ids"], options["workers"])
+
+        if self.used_keys:
+            save_manifest(self.out_dir, self.manifest)
+        removed = evict_charts(
+            self.out_dir,
+            max_bytes=options["cache_max_mb"] * 1024 * 1024,
+            max_age=options["cache_max_age_days"] * 86400,
+            keep=self.used_keys,
+        )
+        if self.used_keys or removed:
+            self.stdout.write(
+                f"  rendered: {self.rendered}, reused: {self.reused}, "
+                f"evicted: {len(removed)}"
+            )
 
+    def job(self, user_id, analytics):
+        return user_id, analytics, self.out_dir, f"user_{user_id}", self.top_n
+
+    def record(self, user_id, charts):
+        self.manifest[f"user_{user_id}"] = {
+            chart.path.name: chart.key for chart in charts
+        }
+        for chart in charts:
+            self.used_keys.add(chart.key)
+            if chart.rendered:
+                self.rendered += 1
+            else:
+                self.reused += 1
+
+    def plot_user(self, user_id):
         User = get_user_model()
         try:
             user = User.objects.get(id=user_id)
         except User.DoesNotExist as exc:
             raise CommandError(f"User with id={user_id} not found") from exc
 
-        qs = (
-            OrderItem.objects.select_related(
-                "order",
-                "font_face_with_price__face__font",
-                "font_face_with_price__face__style",
-            )
-            .filter(order__user=user, font_face_with_price__isnull=False)
-            .values(
-                "order__created_at",
-                "font_face_with_price__license_type",
-                "font_face_with_price__price",
-                "font_face_with_price__face__font__name",
-                "font_face_with_price__face__style__name",
-            )
-        )
-
-        df = pd.DataFrame.from_records(qs)
+        analytics = OrderItemAnalytics.for_user(user).summary(months=True)
 
-        if df.empty:
+        if not analytics.total_items:
             self.stdout.write(self.style.WARNING("No data. Nothing to plot."))
             return
 
-        license_map = dict(LicenseType.choices)
-
-        df["created_at"] = pd.to_datetime(df["order__created_at"], utc=True, errors="coerce")
-        df["license_type_label"] = df["font_face_with_price__license_type"].map(license_map).astype(str)
-        df["price"] = df["font_face_with_price__price"].astype(float)
-        df["font_name"] = df["font_face_with_price__face__font__name"].astype(str)
-        df["style_name"] = df["font_face_with_price__face__style__name"].astype(str)
-
-        by_font = df.groupby("font_name").size()
-        by_license = df.groupby("license_type_label").size()
-        by_style = df.groupby("style_name").size()
-
-        revenue_total = float(df["price"].sum())
-
-        df["month"] = df["created_at"].dt.to_period("M").astype(str)
-        by_month = df.groupby("month").size().sort_index()
-        revenue_by_month = df.groupby("month")["price"].sum().sort_index()
-
-        by_font_top = _top_n_with_other(by_font, top_n)
-        by_style_top = _top_n_with_other(by_style, top_n)
-        by_license_top = by_license.sort_values(ascending=False)
-
-        out_dir.mkdir(parents=True, exist_ok=True)
-
-        now = timezone.now().strftime("%Y%m%d_%H%M%S")
-        prefix = f"user_{user_id}_{now}"
-
-        plt.close("all")
-
-        # 1) Bar: by font
-        fig = plt.figure(figsize=(12, 6))
-        ax = fig.add_subplot(111)
-        ax.bar(by_font_top.index.tolist(), by_font_top.values.tolist())
-        ax.set_title("Licenses count by font")
-        ax.set_xlabel("Font")
-        ax.set_ylabel("Count")
-        ax.tick_params(axis="x", rotation=45, labelsize=9)
-        fig.tight_layout()
-        p1 = out_dir / f"{prefix}_by_font.png"
-        fig.savefig(p1, dpi=160)
-
-        # 2) Pie: by license type
-        fig = plt.figure(figsize=(10, 6))
-        ax = fig.add_subplot(111)
-        ax.pie(
-            by_license_top.values.tolist(),
-            labels=by_license_top.index.tolist(),
-            autopct="%1.1f%%",
-            startangle=90,
-        )
-        ax.set_title("Licenses count by license type")
-        fig.tight_layout()
-        p2 = out_dir / f"{prefix}_by_license.png"
-        fig.savefig(p2, dpi=160)
-
-        # 3) Bar: by style
-        fig = plt.figure(figsize=(12, 6))
-        ax = fig.add_subplot(111)
-        ax.bar(by_style_top.index.tolist(), by_style_top.values.tolist())
-        ax.set_title("Licenses count by style")
-        ax.set_xlabel("Style")
-        ax.set_ylabel("Count")
-        ax.tick_params(axis="x", rotation=45, labelsize=9)
-        fig.tight_layout()
-        p3 = out_dir / f"{prefix}_by_style.png"
-        fig.savefig(p3, dpi=160)
-
-        # 4) Line: licenses by month
-        fig = plt.figure(figsize=(12, 5))
-        ax = fig.add_subplot(111)
-        ax.plot(by_month.index.tolist(), by_month.values.tolist(), marker="o")
-        ax.set_title("Licenses count by month")
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Count")
-        ax.tick_params(axis="x", rotation=45, labelsize=9)
-        fig.tight_layout()
-        p4 = out_dir / f"{prefix}_by_month.png"
-        fig.savefig(p4, dpi=160)
-
-        # 5) Line: revenue by month
-        fig = plt.figure(figsize=(12, 5))
-        ax = fig.add_subplot(111)
-        ax.plot(revenue_by_month.index.tolist(), revenue_by_month.values.tolist(), marker="o")
-        ax.set_title("Revenue by month")
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Revenue")
-        ax.tick_params(axis="x", rotation=45, labelsize=9)
-        fig.tight_layout()
-        p5 = out_dir / f"{prefix}_revenue_by_month.png"
-        fig.savefig(p5, dpi=160)
+        _, _, charts = _render(self.job(user_id, analytics))
+        self.record(user_id, charts)
 
         self.stdout.write(self.style.SUCCESS("Charts saved:"))
-        self.stdout.write(f"  total_items: {len(df)}")
-        self.stdout.write(f"  revenue_total: {round(revenue_total, 2)}")
-        self.stdout.write(f"  {p1}")
-        self.stdout.write(f"  {p2}")
-        self.stdout.write(f"  {p3}")
-        self.stdout.write(f"  {p4}")
-        self.stdout.write(f"  {p5}")
+        self.stdout.write(f"  total_items: {analytics.total_items}")
+        self.stdout.write(
+            f"  revenue_total: {round(float(analytics.revenue_total), 2)}"
+        )
+        for chart in charts:
+            self.stdout.write(f"  {chart.path}")
+
+    def iter_user_summaries(self, user_ids):
+        """Один потоковый запрос по всем позициям, разбитый по пользователям."""
+        items = OrderItem.objects.filter(
+            order__user__isnull=False, font_face_with_price__isnull=False
+        )
+        if user_ids:
+            items = items.filter(order__user_id__in=user_ids)
+        rows = (
+            items.order_by("order__user_id")
+            .values_list("order__user_id", *ROW_FIELDS)
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for user_id, group in groupby(rows, key=itemgetter(0)):
+            yield user_id, summarize_rows(row[1:] for row in group)
+
+    def plot_batch(self, user_ids, workers):
+        users = 0
+        jobs = (
+            self.job(user_id, analytics)
+            for user_id, analytics in self.iter_user_summaries(user_ids)
+        )
+        for user_id, analytics, charts in self.render_all(jobs, workers):
+            users += 1
+            self.record(user_id, charts)
+            if self.verbosity >= 2:
+                self.stdout.write(
+                    f"  user {user_id}: {analytics.total_items} items, "
+                    f"{sum(chart.rendered for chart in charts)} charts rendered"
+                )
+
+        if not users:
+            self.stdout.write(self.style.WARNING("No data. Nothing to plot."))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f"Charts saved for {users} users in {self.out_dir}")
+        )
+
+    def render_all(self, jobs, workers):
+        if workers <= 1:
+            for job in jobs:
+                yield _render(job)
+            return
+
+        # Процессы стартуют через spawn, а не fork: воркеры создаются по мере
+        # отправки задач, когда потоковый курсор уже открыт, и форк унес бы
+        # копию соединения с БД (и фоновые потоки пула psycopg).
+        # Держим в очереди не больше 2 * workers задач, чтобы сводки
+        # не копились в памяти быстрее, чем их успевают отрисовать.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            pending = set()
+            for job in jobs:
+                pending.add(executor.submit(_render, job))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in pending:
+                yield future.result()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Импорт приложения и разбор urlconf — то, что делает воркер uWSGI при старте.
+STARTUP_SCRIPT = (
+    "import {module}\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+)
+
+
+def parse_importtime(output):
+    """Разбирает вывод `python -X importtime` в список (модуль, глубина, self, cumulative) в мкс."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|", 2)
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        raw_name = parts[2].rstrip()
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        rows.append((raw_name.strip(), depth, int(parts[0]), int(parts[1])))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Report -X importtime cumulative import cost of the WSGI application "
+        "and fail if forbidden heavy modules are imported at startup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", default="djangoProject.wsgi")
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument(
+            "--forbid",
+            nargs="*",
+            default=["pandas", "matplotlib"],
+            help="Top-level packages that must not be imported at startup.",
+        )
+
+    def handle(self, *args: Any, **options: Any):
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [str(settings.BASE_DIR), env.get("PYTHONPATH")])
+        )
+        proc = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                STARTUP_SCRIPT.format(module=options["module"]),
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        rows = parse_importtime(proc.stderr)
+        if proc.returncode:
+            raise CommandError(
+                f"Importing {options['module']} failed:\n{proc.stderr[-2000:]}"
+            )
+
+        total_us = sum(cumulative for _, depth, _, cumulative in rows if depth == 0)
+        by_package = defaultdict(int)
+        for name, _, self_us, _ in rows:
+            by_package[name.split(".")[0]] += self_us
+
+        self.stdout.write(
+            f"{options['module']}: {len(rows)} modules, {total_us / 1000:.1f} ms"
+        )
+        self.stdout.write(f"\n{'cumulative ms':>14}  module")
+        for name, _, _, cumulative in sorted(rows, key=lambda row: -row[3])[
+            : options["top"]
+        ]:
+            self.stdout.write(f"{cumulative / 1000:>14.1f}  {name}")
+        self.stdout.write(f"\n{'self ms':>14}  package")
+        for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[
+            : options["top"]
+        ]:
+            self.stdout.write(f"{self_us / 1000:>14.1f}  {package}")
+
+        loaded = sorted(
+            {package for package in options["forbid"] if package in by_package}
+        )
+        if loaded:
+            raise CommandError(
+                f"{options['module']} imports heavy modules at startup: "
+                + ", ".join(loaded)
+            )
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from fonts_app.service import OrderRollupService
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-user daily order analytics rollups from order items."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            default=None,
+            help="Rebuild only this user's rollups (default: everyone).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args: Any, **options: Any):
+        created = OrderRollupService.rebuild(
+            user_id=options["user_id"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rollup rows written: {created}"))
@@ -0,0 +1,420 @@
+from __future__ import annotations
+
+import datetime
+import itertools
+import json
+import platform
+import sys
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+from typing import Any
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, resolve, reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from fonts_app.bench import measure, percentile, seed_orders
+from fonts_app.models import ChartRenderJob, Font, FontFace, FontFacePrice
+from fonts_app.service import CartService, OrderRollupService
+
+URLCONFS = ("fonts_app.urls", "users.urls")
+PASSWORD = "bench-Password-123"
+
+Scenario = namedtuple(
+    "Scenario",
+    ["label", "method", "path", "auth", "data", "before"],
+    defaults=[None, None, None],
+)
+
+# Маршруты, которые не гоняем: шлют письма или меняют учетные данные.
+SKIPPED = {
+    "customuser-activation": "sends email",
+    "customuser-resend-activation": "sends email",
+    "customuser-reset-password": "sends email",
+    "customuser-reset-password-confirm": "needs emailed token",
+    "customuser-reset-username": "sends email",
+    "customuser-reset-username-confirm": "needs emailed token",
+    "customuser-set-password": "changes credentials",
+    "customuser-set-username": "changes credentials",
+    "api-root": "djoser browsable root",
+}
+
+
+class BenchContext:
+    """Пользователи, токены и id объектов, на которых гоняются сценарии."""
+
+    def __init__(self):
+        prices = list(
+            FontFacePrice.objects.order_by("pk").values_list("pk", flat=True)[:500]
+        )
+        if not prices:
+            raise CommandError("The catalog is empty, run seed_benchmark_data first.")
+        self.prices = itertools.cycle(prices)
+        self.font_id = Font.objects.order_by("pk").values_list("pk", flat=True)[0]
+        self.face_id = FontFace.objects.order_by("pk").values_list("pk", flat=True)[0]
+
+        User = get_user_model()
+        stamp = timezone.now().strftime("%Y%m%d%H%M%S%f")
+        self.user = User.objects.create_user(
+            username=f"bench-runner-{stamp}",
+            email=f"bench-runner-{stamp}@example.com",
+            password=PASSWORD,
+        )
+        self.admin = User.objects.create_superuser(
+            username=f"bench-admin-{stamp}",
+            email=f"bench-admin-{stamp}@example.com",
+            password=PASSWORD,
+        )
+        catalog = list(FontFacePrice.objects.filter(pk__in=prices[:50]))
+        seed_orders([self.user, self.admin], 50, catalog)
+        OrderRollupService.rebuild(user_id=self.user.pk)
+        OrderRollupService.rebuild(user_id=self.admin.pk)
+
+        self.tokens = {
+            "user": str(RefreshToken.for_user(self.user).access_token),
+            "admin": str(RefreshToken.for_user(self.admin).access_token),
+        }
+        self.job = ChartRenderJob.objects.create(user=self.user)
+        self.counter = itertools.count()
+        self.week_ago = (timezone.now() - datetime.timedelta(days=7)).date()
+
+    def next_price(self):
+        return next(self.prices)
+
+    def fill_cart(self, client, count=3):
+        cart = CartService.storage.get_for_user(self.user)
+        if cart is None:
+            cart = CartService.storage.create(self.user)
+        CartService.add_items(cart, [self.next_price() for _ in range(count)])
+
+    def refresh_cookie(self, client):
+        client.cookies["refresh_token"] = str(RefreshToken.for_user(self.user))
+
+
+def scenarios(ctx):
+    """Все сценарии; path/data/before вызываются заново на каждый запрос."""
+    fonts = [
+        Scenario("all_fonts", "get", lambda: reverse("all_fonts")),
+        Scenario(
+            "all_fonts page", "get", lambda: reverse("all_fonts") + "?page_size=50"
+        ),
+        Scenario(
+            "all_licenses page",
+            "get",
+            lambda: reverse("all_licenses") + "?page_size=50",
+        ),
+        Scenario(
+            "get_license", "get", lambda: reverse("get_license", args=[ctx.font_id])
+        ),
+        Scenario(
+            "get_styles_and_licenses",
+            "get",
+            lambda: reverse("get_styles_and_licenses", args=[ctx.face_id]),
+        ),
+        Scenario(
+            "catalog_cache_stats",
+            "get",
+            lambda: reverse("catalog_cache_stats"),
+            "admin",
+        ),
+        Scenario(
+            "add_to_cart",
+            "post",
+            lambda: reverse("add_to_cart", args=[ctx.next_price()]),
+            "user",
+        ),
+        Scenario("cart", "get", lambda: reverse("cart"), "user"),
+        Scenario(
+            "cart_batch",
+            "post",
+            lambda: reverse("cart_batch"),
+            "user",
+            lambda: {
+                "add": [ctx.next_price() for _ in range(3)],
+                "remove": [ctx.next_price() for _ in range(3)],
+            },
+        ),
+        Scenario(
+            "remove_from_cart",
+            "delete",
+            lambda: reverse("remove_from_cart", args=[ctx.next_price()]),
+            "user",
+            before=lambda client: ctx.fill_cart(client, 1),
+        ),
+        Scenario(
+            "create_order",
+            "post",
+            lambda: reverse("create_order"),
+            "user",
+            before=ctx.fill_cart,
+        ),
+        Scenario(
+            "user_orders page",
+            "get",
+            lambda: reverse("user_orders") + "?page_size=50",
+            "user",
+        ),
+        Scenario(
+            "user_orders_analytics",
+            "get",
+            lambda: reverse("user_orders_analytics"),
+            "admin",
+        ),
+        Scenario(
+            "orders_export week",
+            "get",
+            lambda: reverse("orders_export") + f"?date_from={ctx.week_ago}",
+            "admin",
+        ),
+        Scenario(
+            "chart_jobs",
+            "post",
+            lambda: reverse("chart_jobs"),
+            "admin",
+            lambda: {"user_id": ctx.user.pk},
+        ),
+        Scenario(
+            "chart_job", "get", lambda: reverse("chart_job", args=[ctx.job.pk]), "admin"
+        ),
+        Scenario(
+            "chart_job_image",
+            "get",
+            lambda: reverse("chart_job_image", args=[ctx.job.pk, "by_font"]),
+            "admin",
+        ),
+    ]
+    users = [
+        Scenario(
+            "login_token_custom",
+            "post",
+            lambda: reverse("users:login_token_custom"),
+            data=lambda: {"email": ctx.user.email, "password": PASSWORD},
+        ),
+        Scenario(
+            "token_verify",
+            "post",
+            lambda: reverse("users:token_verify"),
+            data=lambda: {"token": ctx.tokens["user"]},
+        ),
+        Scenario(
+            "token_blacklist",
+            "post",
+            lambda: reverse("users:token_blacklist"),
+            before=ctx.refresh_cookie,
+        ),
+        Scenario(
+            "token_refresh (cookie)",
+            "post",
+            lambda: "/api/token/refresh/",
+            before=ctx.refresh_cookie,
+        ),
+        Scenario(
+            "register",
+            "post",
+            lambda: "/api/register/",
+            data=lambda: {
+                "email": f"bench-register-{next(ctx.counter)}@{ctx.user.username}.com",
+                "password": PASSWORD,
+            },
+        ),
+        Scenario(
+            "update_user",
+            "patch",
+            lambda: "/api/update/user/",
+            "user",
+            lambda: {"first_name": "Bench"},
+        ),
+        Scenario(
+            "customuser-me", "get", lambda: reverse("users:customuser-me"), "user"
+        ),
+        Scenario(
+            "customuser-list", "get", lambda: reverse("users:customuser-list"), "admin"
+        ),
+        Scenario(
+            "customuser-detail",
+            "get",
+            lambda: reverse("users:customuser-detail", args=[ctx.user.pk]),
+            "admin",
+        ),
+        Scenario(
+            "jwt-create",
+            "post",
+            lambda: reverse("users:jwt-create"),
+            data=lambda: {"email": ctx.user.email, "password": PASSWORD},
+        ),
+        Scenario(
+            "jwt-refresh",
+            "post",
+            lambda: reverse("users:jwt-refresh"),
+            data=lambda: {"refresh": str(RefreshToken.for_user(ctx.user))},
+        ),
+        Scenario(
+            "jwt-verify",
+            "post",
+            lambda: reverse("users:jwt-verify"),
+            data=lambda: {"token": ctx.tokens["user"]},
+        ),
+    ]
+    return fonts + users
+
+
+def url_routes():
+    """(route, name) всех маршрутов из URLCONFS, без дублей с суффиксом формата."""
+    routes = {}
+
+    def walk(patterns, prefix="", urlconf=None):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                name = getattr(pattern.urlconf_name, "__name__", pattern.urlconf_name)
+                yield from walk(
+                    pattern.url_patterns, prefix + str(pattern.pattern), urlconf or name
+                )
+            elif urlconf in URLCONFS:
+                yield prefix + str(pattern.pattern), pattern.name
+
+    for route, name in walk(get_resolver().url_patterns):
+        key = name or route
+        routes.setdefault(key, route)
+    return routes
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every URL of fonts_app and users through the Django test "
+        "client: p50/p95/p99 latency, query count and allocations. Runs inside "
+        "a rolled-back transaction; results can be saved as JSON and compared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--only", nargs="+", help="Scenario labels to run.")
+        parser.add_argument("--output", type=str, help="Write results to this JSON.")
+        parser.add_argument(
+            "--compare", type=str, help="Previous JSON results to compare p50 with."
+        )
+
+    def handle(self, *args: Any, **options: Any):
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            with transaction.atomic():
+                report = self.run(options)
+                transaction.set_rollback(True)
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Results saved to {options['output']}")
+        if options["compare"]:
+            self.compare(report, json.loads(Path(options["compare"]).read_text()))
+
+    def run(self, options):
+        ctx = BenchContext()
+        selected = scenarios(ctx)
+        if options["only"]:
+            selected = [s for s in selected if s.label in options["only"]]
+
+        covered = {resolve(scenario.path().split("?")[0]) for scenario in selected}
+        covered = {match.url_name or match.route for match in covered}
+        missing = {
+            key: route
+            for key, route in url_routes().items()
+            if key not in covered and key not in SKIPPED
+        }
+
+        self.stdout.write(
+            f"{'scenario':<26}{'status':>8}{'p50 ms':>10}{'p95 ms':>10}"
+            f"{'p99 ms':>10}{'queries':>9}{'alloc KiB':>11}"
+        )
+        results = {}
+        for scenario in selected:
+            result = self.bench(ctx, scenario, options["repeat"])
+            results[scenario.label] = result
+            self.stdout.write(
+                f"{scenario.label:<26}{result['status']:>8}{result['p50_ms']:>10.2f}"
+                f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['queries']:>9}{result['alloc_kib']:>11.1f}"
+            )
+
+        if missing and not options["only"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Routes without a scenario: " + ", ".join(sorted(missing.values()))
+                )
+            )
+        return {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "repeat": options["repeat"],
+                "argv": sys.argv[1:],
+            },
+            "results": results,
+            "skipped": SKIPPED,
+            "missing": sorted(missing.values()),
+        }
+
+    def request(self, client, ctx, scenario):
+        if scenario.before:
+            scenario.before(client)
+        headers = {}
+        if scenario.auth:
+            headers["Authorization"] = f"Bearer {ctx.tokens[scenario.auth]}"
+        kwargs = {"headers": headers}
+        if scenario.data:
+            kwargs.update(data=scenario.data(), content_type="application/json")
+        response = getattr(client, scenario.method)(scenario.path(), **kwargs)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def bench(self, ctx, scenario, repeat):
+        client = Client()
+        statuses = set()
+
+        def once():
+            statuses.add(self.request(client, ctx, scenario).status_code)
+
+        # Прогрев (кеш каталога, ленивые импорты) в замеры не попадает.
+        once()
+        timings = measure(once, repeat)
+
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                once()
+                after, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "method": scenario.method.upper(),
+            "status": ",".join(str(code) for code in sorted(statuses)),
+            "p50_ms": percentile(timings, 50),
+            "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99),
+            "mean_ms": sum(timings) / len(timings),
+            "queries": len(queries),
+            "alloc_kib": (after - before) / 1024,
+            "peak_kib": (peak - before) / 1024,
+        }
+
+    def compare(self, report, baseline):
+        self.stdout.write(f"\n{'scenario':<26}{'base p50':>10}{'p50':>10}{'change':>9}")
+        for label, result in report["results"].items():
+            previous = baseline.get("results", {}).get(label)
+            if not previous:
+                continue
+            change = (result["p50_ms"] / previous["p50_ms"] - 1) * 100
+            self.stdout.write(
+                f"{label:<26}{previous['p50_ms']:>10.2f}{result['p50_ms']:>10.2f}"
+                f"{change:>+8.1f}%"
+            )
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import random
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from fonts_app.bench import seed_carts, seed_catalog, seed_orders, seed_users
+from fonts_app.service import OrderRollupService
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic fonts, styles, faces, prices for "
+        "every license type, users, carts and orders for benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fonts", type=int, default=1000)
+        parser.add_argument("--styles", type=int, default=8)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--carts", type=int, default=500)
+        parser.add_argument("--cart-items", type=int, default=5)
+        parser.add_argument("--orders-per-user", type=int, default=20)
+        parser.add_argument("--items-per-order", type=int, default=3)
+        parser.add_argument(
+            "--prefix",
+            default="Bench",
+            help="Name prefix; use a new one to seed again into the same database.",
+        )
+        parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+
+    def handle(self, *args: Any, **options: Any):
+        random.seed(options["seed"])
+        prefix = options["prefix"]
+
+        with transaction.atomic():
+            prices = seed_catalog(options["fonts"], options["styles"], prefix=prefix)
+            users = seed_users(options["users"], prefix=prefix.lower())
+            carts = seed_carts(
+                users[: options["carts"]], prices, items_per_cart=options["cart_items"]
+            )
+            orders = seed_orders(
+                users,
+                options["orders_per_user"],
+                prices,
+                items_per_order=options["items_per_order"],
+            )
+            rollups = OrderRollupService.rebuild()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {options['fonts']} fonts x {options['styles']} styles "
+                f"({len(prices)} prices), {len(users)} users, {len(carts)} carts, "
+                f"{len(orders)} orders, {rollups} rollup rows"
+            )
+        )
@@ -12,6 +12,7 @@ class Font(models.Model):
     author = models.CharField(max_length=256, verbose_name="Имя автора", null=True)
     date_release = models.DateField(null=True, blank=True)
     desc = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -94,11 +95,39 @@ class Order(models.Model):
     number = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     user = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Значение заголовка Idempotency-Key запроса, создавшего заказ",
+    )
 
     def __str__(self):
         return f"Заказ от {self.created_at} №{self.number} пользователя {self.user}"
 
     class Meta:
+        indexes = [
+            # История заказов пользователя (от новых к старым, keyset по id).
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_created_idx"
+            ),
+            # Выгрузка заказов за период.
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+        ]
+        constraints = [
+            # Ключ уникален в пределах покупателя. У гостевых заказов user
+            # пустой, их ключ содержит id корзины (см. CreateOrderView).
+            models.UniqueConstraint(
+                fields=["user", "idempotency_key"],
+                name="order_user_idempotency_key_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["idempotency_key"],
+                condition=models.Q(user__isnull=True),
+                name="order_guest_idempotency_key_uniq",
+            ),
+        ]
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
 
@@ -142,5 +171,92 @@ class Cart(models.Model):
         return f'Корзина №{self.id} для {self.user if self.user else "анонимного пользователя"}'
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user"], name="uniq_cart_user"),
+        ]
         verbose_name = "Корзина"
-        verbose_name_plural = "Корзины"
\ No newline at end of file
+        verbose_name_plural = "Корзины"
+
+
+class UserOrderRollup(models.Model):
+    """
+    Предрасчитанная аналитика заказов: сколько лицензий и на какую сумму
+    купил пользователь за день (UTC) в разрезе шрифта, начертания и типа
+    лицензии. Сумма - по текущей цене позиции, как без сводок. Обновляется
+    вместе с оформлением заказа, правкой и удалением заказов и позиций, а
+    после смены цены - задачей Celery (fonts_app.signals); полностью
+    пересчитывается командой rebuild_order_rollups.
+    """
+
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="order_rollups"
+    )
+    day = models.DateField()
+    font = models.ForeignKey("Font", on_delete=models.CASCADE)
+    style = models.ForeignKey("FontStyle", on_delete=models.CASCADE)
+    license_type = models.CharField(max_length=128, choices=LicenseType.choices)
+    items_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.user_id} {self.day}: {self.font_id}/{self.style_id}/{self.license_type} x{self.items_count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day", "font", "style", "license_type"],
+                name="uniq_user_order_rollup",
+            )
+        ]
+        verbose_name = "Сводка заказов пользователя за день"
+        verbose_name_plural = "Сводки заказов пользователей по дням"
+
+
+class ChartRenderJob(models.Model):
+    """Фоновая отрисовка графиков аналитики заказов пользователя (Celery)."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        RUNNING = "running", "Рисуется"
+        DONE = "done", "Готово"
+        FAILED = "failed", "Ошибка"
+
+    class Format(models.TextChoices):
+        PNG = "png", "PNG"
+        SVG = "svg", "SVG"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="chart_jobs",
+        verbose_name="Пользователь, по заказам которого строятся графики",
+    )
+    requested_by = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="requested_chart_jobs",
+    )
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+    image_format = models.CharField(
+        max_length=8, choices=Format.choices, default=Format.PNG
+    )
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    charts = models.JSONField(
+        default=dict, blank=True, help_text="Имя графика -> хеш файла в кеше"
+    )
+    total_items = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Графики пользователя {self.user_id} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Задача отрисовки графиков"
+        verbose_name_plural = "Задачи отрисовки графиков"
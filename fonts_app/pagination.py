@@ -0,0 +1,141 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничная выдача по ключу (keyset): следующая страница начинается
+    строго после последней строки предыдущей, без OFFSET, поэтому время
+    ответа не зависит от того, как далеко клиент пролистал список.
+
+    Включается только если клиент передал page_size или cursor, иначе
+    view отдает весь список, как раньше.
+    """
+
+    ordering = ("id",)
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Неверный курсор"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page([item async for item in queryset])
+
+    def page_queryset(self, queryset, request):
+        params = request.query_params
+        if (
+            self.page_size_query_param not in params
+            and self.cursor_query_param not in params
+        ):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        # Лишняя строка показывает, есть ли следующая страница.
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, items):
+        self.has_next = len(items) > self.page_size
+        items = items[: self.page_size]
+        self.next_position = self.get_position(items[-1]) if self.has_next else None
+        return items
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.KEYSET_PAGE_SIZE
+        if page_size <= 0:
+            return settings.KEYSET_PAGE_SIZE
+        return min(page_size, settings.KEYSET_MAX_PAGE_SIZE)
+
+    def get_position(self, obj):
+        return [
+            self.model._meta.get_field(name.lstrip("-")).value_to_string(obj)
+            for name in self.ordering
+        ]
+
+    def after(self, position):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, position):
+            field = name.lstrip("-")
+            lookup = "lt" if name.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(name.lstrip("-")).to_python(value)
+                for name, value in zip(self.ordering, position)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        # Относительная ссылка: ответ каталога кэшируется по пути, без хоста
+        # и схемы, и абсолютная ссылка досталась бы всем от первого клиента.
+        url = self.request.get_full_path()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_data(self, data):
+        return {"next": self.get_next_link(), "results": data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri-reference"},
+                "results": schema,
+            },
+        }
+
+
+class CatalogPagination(KeysetPagination):
+    ordering = ("id",)
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
@@ -1,14 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from djangoProject.metrics import TimedSerializerMixin
 from rest_framework import serializers
-from .models import FontFacePrice, Font, Cart, Order, OrderItem
+from .models import ChartRenderJob, FontFacePrice, Font, Cart, Order, OrderItem
 
 
-class FontSerializer(serializers.ModelSerializer):
+class FontSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Font
-        fields = "__all__"
+        # updated_at нужен только выгрузке каталога (export_catalog).
+        exclude = ["updated_at"]
 
 
-class FontFacePriceSerializer(serializers.ModelSerializer):
+class FontFacePriceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     font_name = serializers.CharField(source="face.font.name", read_only=True)
     font_author = serializers.CharField(source="face.font.author", read_only=True)
     font_date_release = serializers.CharField(
@@ -28,13 +32,13 @@ class FontFacePriceSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class StylesAndLicensesSerializer(serializers.ModelSerializer):
+class StylesAndLicensesSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = FontFacePrice
         fields = "__all__"
 
 
-class CartSerializer(serializers.Serializer):
+class CartSerializer(TimedSerializerMixin, serializers.Serializer):
     items = FontFacePriceSerializer(many=True, read_only=True)
 
     class Meta:
@@ -42,18 +46,69 @@ class CartSerializer(serializers.Serializer):
         fields = "__all__"
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    font_face_with_price = FontFacePriceSerializer(read_only=True)
+class CartBatchSerializer(serializers.Serializer):
+    add = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+
 
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    font_face_with_price = FontFacePriceSerializer(read_only=True)
 
     class Meta:
         model = OrderItem
         fields = "__all__"
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
-        fields = "__all__"
+        exclude = ["idempotency_key"]
+
+
+class DateRangeSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False, allow_null=True, default=None)
+    date_to = serializers.DateField(required=False, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        if attrs["date_from"] and attrs["date_to"]:
+            if attrs["date_from"] > attrs["date_to"]:
+                raise serializers.ValidationError(
+                    {"date_to": "Дата окончания раньше даты начала"}
+                )
+        return attrs
+
+
+class ChartRenderJobCreateSerializer(DateRangeSerializer):
+    user_id = serializers.PrimaryKeyRelatedField(
+        queryset=get_user_model().objects.all(), source="user"
+    )
+    image_format = serializers.ChoiceField(
+        choices=ChartRenderJob.Format.choices, default=ChartRenderJob.Format.PNG
+    )
+
+
+class OrderExportSerializer(DateRangeSerializer):
+    # Не "format": этот параметр занят DRF под выбор рендерера.
+    export_format = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+
+
+class ChartRenderJobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    charts = serializers.SerializerMethodField()
+
+    def get_charts(self, obj):
+        request = self.context.get("request")
+        urls = {}
+        for name in obj.charts:
+            url = reverse("chart_job_image", args=[obj.pk, name])
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+    class Meta:
+        model = ChartRenderJob
+        exclude = ["requested_by"]
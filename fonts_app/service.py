@@ -1,17 +1,756 @@
-from .models import Cart
+import csv
+import datetime
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count,
+    F,
+    Prefetch,
+    Sum,
+    aprefetch_related_objects,
+    prefetch_related_objects,
+)
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .analytics import OrderItemAnalytics
+from .charts import chart_object_path, evict_charts, render_charts
+from .models import (
+    Cart,
+    ChartRenderJob,
+    FontFacePrice,
+    Order,
+    OrderItem,
+    UserOrderRollup,
+)
+
+
+def _items_queryset():
+    return FontFacePrice.objects.select_related("face__font", "face__style")
+
+
+def _created_between(items, date_from=None, date_to=None):
+    """Позиции заказов, оформленных с date_from по date_to включительно (дни UTC)."""
+    utc = datetime.timezone.utc
+    if date_from:
+        start = datetime.datetime.combine(date_from, datetime.time.min, tzinfo=utc)
+        items = items.filter(order__created_at__gte=start)
+    if date_to:
+        end = datetime.datetime.combine(date_to, datetime.time.min, tzinfo=utc)
+        items = items.filter(order__created_at__lt=end + datetime.timedelta(days=1))
+    return items
+
+
+class ORMCartStorage:
+    """
+    Корзины в таблице Cart. Изменения выполняются в транзакции под
+    блокировкой строки корзины за фиксированное число запросов, а сумма
+    обновляется в БД через F(), поэтому параллельные добавления не теряются.
+    """
+
+    model = Cart
+
+    def get(self, cart_id, for_update=False):
+        carts = self.model.objects.filter(pk=cart_id, user__isnull=True)
+        if for_update:
+            carts = carts.select_for_update()
+        return carts.first()
+
+    def get_for_user(self, user, for_update=False):
+        carts = self.model.objects.filter(user_id=user.pk)
+        if for_update:
+            carts = carts.select_for_update()
+        return carts.first()
+
+    async def aget(self, cart_id):
+        return await self.model.objects.filter(pk=cart_id, user__isnull=True).afirst()
+
+    async def aget_for_user(self, user):
+        return await self.model.objects.filter(user_id=user.pk).afirst()
+
+    def create(self, user=None):
+        return self.model.objects.create(user_id=user.pk if user else None)
+
+    def item_ids(self, cart):
+        return list(cart.items.values_list("pk", flat=True))
+
+    def load_items(self, cart):
+        prefetch_related_objects([cart], Prefetch("items", queryset=_items_queryset()))
+
+    async def aload_items(self, cart):
+        await aprefetch_related_objects(
+            [cart], Prefetch("items", queryset=_items_queryset())
+        )
+
+    def add_items(self, cart, item_ids):
+        through = self.model.items.through
+        prices = dict(
+            FontFacePrice.objects.filter(pk__in=item_ids).values_list("pk", "price")
+        )
+        if len(prices) != len(set(item_ids)):
+            raise FontFacePrice.DoesNotExist
+
+        existing = set(
+            through.objects.filter(
+                cart_id=cart.pk, fontfaceprice_id__in=prices
+            ).values_list("fontfaceprice_id", flat=True)
+        )
+        added = [pk for pk in prices if pk not in existing]
+        if not added:
+            return
+
+        through.objects.bulk_create(
+            through(cart_id=cart.pk, fontfaceprice_id=pk) for pk in added
+        )
+        self.model.objects.filter(pk=cart.pk).update(
+            sum=F("sum") + sum(prices[pk] for pk in added)
+        )
+
+    def remove_items(self, cart, item_ids):
+        through = self.model.items.through
+        removed = list(
+            FontFacePrice.objects.filter(cart=cart, pk__in=item_ids).values_list(
+                "pk", "price"
+            )
+        )
+        if not removed:
+            return
+
+        through.objects.filter(
+            cart_id=cart.pk, fontfaceprice_id__in=[pk for pk, _ in removed]
+        ).delete()
+        self.model.objects.filter(pk=cart.pk).update(
+            sum=F("sum") - sum(price for _, price in removed)
+        )
+
+    def delete(self, cart):
+        cart.delete()
+
+    def checkout(self, cart):
+        cart = self.model.objects.select_for_update().filter(pk=cart.pk).first()
+        if cart is None:
+            return None
+        item_ids = self.item_ids(cart)
+        cart.delete()
+        return cart.user_id, item_ids
+
+    def release(self, cart):
+        # Удаление корзины откатывается вместе с транзакцией заказа.
+        pass
+
+
+class GuestCart:
+    """Анонимная корзина, которая живет в кэше, а не в БД."""
+
+    user = None
+    user_id = None
+
+    def __init__(self, pk, item_ids=()):
+        self.pk = self.id = pk
+        self.item_ids = set(item_ids)
+
+    def items_queryset(self):
+        return _items_queryset().filter(pk__in=self.item_ids).order_by("pk")
+
+    @cached_property
+    def items(self):
+        return list(self.items_queryset())
+
+
+class CacheCartStorage:
+    """
+    Анонимные корзины в кэше "carts" (Redis в проде, locmem в тестах):
+    ключ cart:<uuid> хранит множество id позиций и истекает через
+    GUEST_CART_TTL после последнего изменения. В БД корзина попадает
+    только при входе пользователя или оформлении заказа.
+
+    Изменения идут под блокировкой cart:<uuid>:lock (cache.add атомарен и в
+    Redis, и в locmem), поэтому параллельные добавления не теряются.
+    Оформление занимает корзину отметкой cart:<uuid>:checkout (параллельное
+    оформление ждет ее снятия), а удаляет корзину только после коммита заказа.
+    """
+
+    cache_alias = "carts"
+    lock_timeout = 5
+    checkout_timeout = 30
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def key(self, cart_id):
+        return f"cart:{cart_id}"
+
+    def get(self, cart_id, for_update=False):
+        item_ids = self.cache.get(self.key(cart_id))
+        if item_ids is None:
+            return None
+        return GuestCart(cart_id, item_ids)
+
+    async def aget(self, cart_id):
+        item_ids = await self.cache.aget(self.key(cart_id))
+        if item_ids is None:
+            return None
+        return GuestCart(cart_id, item_ids)
+
+    def create(self, user=None):
+        return GuestCart(uuid.uuid4())
+
+    def item_ids(self, cart):
+        return list(cart.item_ids)
+
+    def load_items(self, cart):
+        cart.items
+
+    async def aload_items(self, cart):
+        cart.items = [item async for item in cart.items_queryset()]
+
+    def stored_ids(self, cart_id):
+        return self.cache.get(self.key(cart_id), set())
+
+    def save(self, cart):
+        self.cache.set(self.key(cart.pk), cart.item_ids, settings.GUEST_CART_TTL)
+        cart.__dict__.pop("items", None)
+
+    @contextmanager
+    def locked(self, cart_id):
+        # Блокировка истекает сама, если процесс упал, не сняв ее.
+        key = f"{self.key(cart_id)}:lock"
+        token = uuid.uuid4().hex
+        while not self.cache.add(key, token, self.lock_timeout):
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    def update(self, cart, add=(), remove=()):
+        """Меняет сохраненное множество позиций, а не копию из cart."""
+        with self.locked(cart.pk):
+            cart.item_ids = (self.stored_ids(cart.pk) | set(add)) - set(remove)
+            self.save(cart)
+
+    def add_items(self, cart, item_ids):
+        item_ids = set(item_ids)
+        if FontFacePrice.objects.filter(pk__in=item_ids).count() != len(item_ids):
+            raise FontFacePrice.DoesNotExist
+        self.update(cart, add=item_ids)
+
+    def remove_items(self, cart, item_ids):
+        self.update(cart, remove=item_ids)
+
+    def delete(self, cart):
+        # Например, после слияния с корзиной пользователя: при откате
+        # транзакции гостевая корзина должна остаться.
+        key = self.key(cart.pk)
+        transaction.on_commit(lambda: self.cache.delete(key))
+
+    def checkout_key(self, cart_id):
+        return f"{self.key(cart_id)}:checkout"
+
+    def checkout(self, cart):
+        claim = self.checkout_key(cart.pk)
+        # add() вернет True только одному из параллельных оформлений.
+        # Остальные ждут его исхода, как select_for_update у ORMCartStorage:
+        # после коммита корзины уже нет, после отката ее можно оформить.
+        deadline = time.monotonic() + self.checkout_timeout
+        while not self.cache.add(claim, 1, self.checkout_timeout):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.005)
+        item_ids = self.cache.get(self.key(cart.pk))
+        if item_ids is None:
+            self.cache.delete(claim)
+            return None
+        keys = [self.key(cart.pk), claim]
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+        return None, list(
+            FontFacePrice.objects.filter(pk__in=item_ids).values_list("pk", flat=True)
+        )
+
+    def release(self, cart):
+        """Снимает отметку оформления, если заказ не создан."""
+        self.cache.delete(self.checkout_key(cart.pk))
+
 
 class CartService:
+    """
+    Точка входа для view: корзины пользователей хранятся в БД
+    (ORMCartStorage), анонимные - в хранилище из GUEST_CART_STORAGE.
+    """
+
     model = Cart
+    storage = ORMCartStorage()
+
+    @classmethod
+    def guest_storage(cls):
+        return import_string(settings.GUEST_CART_STORAGE)()
 
     @classmethod
-    def get_cart_object(cls, request):
+    def storage_for(cls, cart):
+        return cls.storage if isinstance(cart, Cart) else cls.guest_storage()
+
+    @staticmethod
+    def _cart_id_from_cookies(request):
+        try:
+            return uuid.UUID(request.COOKIES.get("cart_id", ""))
+        except ValueError:
+            return None
+
+    @classmethod
+    def _guest_cart(cls, request, for_update=False):
+        cart_id = cls._cart_id_from_cookies(request)
+        if cart_id is None:
+            return None
+        return cls.guest_storage().get(cart_id, for_update=for_update)
+
+    @classmethod
+    def get_cart_object(cls, request, with_items=False):
         user = request.user
-        cart_id_from_cookies = request.COOKIES.get("cart_id")
         cart = None
         if user.is_authenticated:
-            cart = cls.model.objects.filter(user=user).first()
+            cart = cls.storage.get_for_user(user)
 
-        if cart_id_from_cookies and cart is None:
-            cart = cls.model.objects.filter(pk=cart_id_from_cookies).first()
+        if cart is None:
+            cart = cls._guest_cart(request)
+
+        if cart is not None and with_items:
+            cls.load_items(cart)
+
+        return cart
+
+    @classmethod
+    async def aget_cart_object(cls, request, user, with_items=False):
+        """get_cart_object() для async view: пользователь передается явно."""
+        cart = None
+        if user.is_authenticated:
+            cart = await cls.storage.aget_for_user(user)
+
+        if cart is None:
+            cart_id = cls._cart_id_from_cookies(request)
+            if cart_id is not None:
+                cart = await cls.guest_storage().aget(cart_id)
+
+        if cart is not None and with_items:
+            await cls.storage_for(cart).aload_items(cart)
+
+        return cart
+
+    @classmethod
+    def merge_guest_cart(cls, request, user):
+        """Переносит анонимную корзину из cookie в корзину пользователя."""
+        guest_cart = cls._guest_cart(request, for_update=True)
+        cart = cls.storage.get_for_user(user, for_update=True)
+        if guest_cart is None:
+            return cart
+
+        if cart is None:
+            cart = cls._create_user_cart(user)
+        guest_storage = cls.storage_for(guest_cart)
+        item_ids = guest_storage.item_ids(guest_cart)
+        if item_ids:
+            cls.storage.add_items(cart, item_ids)
+        guest_storage.delete(guest_cart)
+        return cart
+
+    @classmethod
+    def _create_user_cart(cls, user):
+        try:
+            with transaction.atomic():
+                return cls.storage.create(user)
+        except IntegrityError:
+            # Корзину только что создал параллельный запрос.
+            return cls.storage.get_for_user(user, for_update=True)
 
-        return cart
\ No newline at end of file
+    @classmethod
+    def get_cart_for_update(cls, request, create=False):
+        """
+        Возвращает (cart, created); вызывается внутри transaction.atomic().
+        Анонимная корзина из cookie у вошедшего пользователя сливается с его
+        корзиной.
+        """
+        user = request.user
+        if not user.is_authenticated:
+            cart = cls._guest_cart(request, for_update=True)
+            if cart is None and create:
+                return cls.guest_storage().create(), True
+            return cart, False
+
+        cart = cls.merge_guest_cart(request, user)
+        if cart is None and create:
+            return cls._create_user_cart(user), True
+        return cart, False
+
+    @classmethod
+    def add_items(cls, cart, item_ids):
+        if item_ids:
+            cls.storage_for(cart).add_items(cart, item_ids)
+
+    @classmethod
+    def remove_items(cls, cart, item_ids):
+        if item_ids:
+            cls.storage_for(cart).remove_items(cart, item_ids)
+
+    @classmethod
+    def load_items(cls, cart):
+        cls.storage_for(cart).load_items(cart)
+
+    @classmethod
+    def checkout(cls, cart):
+        return cls.storage_for(cart).checkout(cart)
+
+    @classmethod
+    def release(cls, cart):
+        cls.storage_for(cart).release(cart)
+
+    @classmethod
+    def merge_duplicate_user_carts(cls):
+        """
+        Сливает корзины пользователей, у которых их несколько, в одну и
+        возвращает число удаленных корзин. До ограничения uniq_cart_user
+        AddToCartView привязывал анонимную корзину к пользователю, даже если
+        корзина у него уже была; без слияния migrate упадет на таких данных.
+        """
+        user_ids = list(
+            cls.model.objects.filter(user__isnull=False)
+            .values("user_id")
+            .annotate(carts=Count("pk"))
+            .filter(carts__gt=1)
+            .values_list("user_id", flat=True)
+        )
+        deleted = 0
+        for user_id in user_ids:
+            with transaction.atomic():
+                cart, *duplicates = (
+                    cls.model.objects.select_for_update()
+                    .filter(user_id=user_id)
+                    .order_by("pk")
+                )
+                for duplicate in duplicates:
+                    item_ids = cls.storage.item_ids(duplicate)
+                    if item_ids:
+                        cls.storage.add_items(cart, item_ids)
+                    cls.storage.delete(duplicate)
+                deleted += len(duplicates)
+        return deleted
+
+
+class OrderService:
+    model = Order
+
+    @classmethod
+    def with_items(cls, queryset):
+        items = OrderItem.objects.select_related(
+            "font_face_with_price__face__font",
+            "font_face_with_price__face__style",
+        )
+        return queryset.prefetch_related(Prefetch("items", queryset=items))
+
+    @classmethod
+    def get_by_idempotency_key(cls, user_id, key):
+        orders = cls.model.objects.filter(user_id=user_id, idempotency_key=key)
+        return cls.with_items(orders).first()
+
+    @classmethod
+    def create_from_cart(cls, cart, idempotency_key=None):
+        """
+        Оформляет заказ из корзины одной транзакцией и удаляет корзину.
+
+        Возвращает (order, created). Повтор с тем же idempotency_key от
+        того же владельца корзины возвращает уже созданный заказ, в том числе
+        если параллельный запрос оформил корзину, пока этот ждал; если
+        корзину оформили без этого ключа, возвращает (None, False).
+        """
+        try:
+            with transaction.atomic():
+                checked_out = CartService.checkout(cart)
+                if checked_out is None:
+                    order = None
+                    if idempotency_key:
+                        order = cls.get_by_idempotency_key(
+                            cart.user_id, idempotency_key
+                        )
+                    return order, False
+
+                user_id, item_ids = checked_out
+                order = cls.model.objects.create(
+                    user_id=user_id,
+                    idempotency_key=idempotency_key,
+                )
+                OrderItem.objects.bulk_create(
+                    OrderItem(order=order, font_face_with_price_id=pk)
+                    for pk in item_ids
+                )
+                if user_id is not None:
+                    OrderRollupService.refresh_day(
+                        user_id, OrderRollupService.day_of(order.created_at)
+                    )
+        except Exception as exc:
+            # Транзакция откатилась, корзина остается у покупателя.
+            CartService.release(cart)
+            if not isinstance(exc, IntegrityError) or not idempotency_key:
+                raise
+            return cls.get_by_idempotency_key(cart.user_id, idempotency_key), False
+
+        return cls.with_items(cls.model.objects.filter(pk=order.pk)).get(), True
+
+
+class OrderRollupService:
+    """
+    Поддерживает таблицу UserOrderRollup. Сводка за день пересчитывается
+    целиком из OrderItem, поэтому обновление идемпотентно и стоит столько,
+    сколько позиций у пользователя за этот день, а не за всю историю.
+    """
+
+    model = UserOrderRollup
+    timezone = datetime.timezone.utc
+
+    @classmethod
+    def day_of(cls, moment):
+        return moment.astimezone(cls.timezone).date()
+
+    @classmethod
+    def aggregate(cls, items):
+        return (
+            items.filter(order__user__isnull=False, font_face_with_price__isnull=False)
+            .annotate(day=TruncDate("order__created_at", tzinfo=cls.timezone))
+            .values(
+                "order__user_id",
+                "day",
+                "font_face_with_price__face__font_id",
+                "font_face_with_price__face__style_id",
+                "font_face_with_price__license_type",
+            )
+            .annotate(
+                items_count=Count("pk"), revenue=Sum("font_face_with_price__price")
+            )
+            .order_by()
+        )
+
+    @classmethod
+    def build(cls, rows):
+        return [
+            cls.model(
+                user_id=row["order__user_id"],
+                day=row["day"],
+                font_id=row["font_face_with_price__face__font_id"],
+                style_id=row["font_face_with_price__face__style_id"],
+                license_type=row["font_face_with_price__license_type"],
+                items_count=row["items_count"],
+                revenue=row["revenue"],
+            )
+            for row in rows
+        ]
+
+    @classmethod
+    def refresh_day(cls, user_id, day):
+        start = datetime.datetime.combine(day, datetime.time.min, tzinfo=cls.timezone)
+        items = OrderItem.objects.filter(
+            order__user_id=user_id,
+            order__created_at__gte=start,
+            order__created_at__lt=start + datetime.timedelta(days=1),
+        )
+        cls.model.objects.filter(user_id=user_id, day=day).delete()
+        cls.model.objects.bulk_create(cls.build(cls.aggregate(items)))
+
+    @classmethod
+    def refresh_price(cls, price_id):
+        """
+        Пересчитывает дни, в которые покупали позицию price_id: выручка в
+        сводке считается по текущей цене, как в OrderItemAnalytics.
+        """
+        days = list(
+            OrderItem.objects.filter(
+                font_face_with_price_id=price_id, order__user__isnull=False
+            )
+            .annotate(day=TruncDate("order__created_at", tzinfo=cls.timezone))
+            .values_list("order__user_id", "day")
+            .distinct()
+            .order_by()
+        )
+        for user_id, day in days:
+            with transaction.atomic():
+                cls.refresh_day(user_id, day)
+        return len(days)
+
+    @classmethod
+    def rebuild(cls, user_id=None, batch_size=5000):
+        items = OrderItem.objects.all()
+        rollups = cls.model.objects.all()
+        if user_id is not None:
+            items = items.filter(order__user_id=user_id)
+            rollups = rollups.filter(user_id=user_id)
+
+        with transaction.atomic():
+            rollups.delete()
+            created = cls.model.objects.bulk_create(
+                cls.build(cls.aggregate(items).iterator(chunk_size=batch_size)),
+                batch_size=batch_size,
+            )
+        return len(created)
+
+
+class ChartRenderService:
+    """
+    Графики аналитики заказов по запросу из API. Отрисовка идет в задаче
+    Celery, файлы кладутся в общий кеш графиков settings.CHARTS_ROOT.
+    """
+
+    model = ChartRenderJob
+
+    @classmethod
+    def queue(cls, user, requested_by=None, date_from=None, date_to=None, **kwargs):
+        from .tasks import render_order_charts
+
+        job = cls.model.objects.create(
+            user=user,
+            requested_by=requested_by,
+            date_from=date_from,
+            date_to=date_to,
+            **kwargs,
+        )
+        transaction.on_commit(lambda: render_order_charts.delay(str(job.pk)))
+        return job
+
+    @classmethod
+    def items(cls, job):
+        items = OrderItem.objects.filter(order__user_id=job.user_id)
+        return _created_between(items, job.date_from, job.date_to)
+
+    @classmethod
+    def run(cls, job_id):
+        # RUNNING тоже берем: при acks_late задачу упавшего воркера выполнят
+        # повторно, а одинаковые графики в кеше просто перезапишутся.
+        started = cls.model.objects.filter(
+            pk=job_id, status__in=[cls.model.Status.PENDING, cls.model.Status.RUNNING]
+        ).update(status=cls.model.Status.RUNNING)
+        if not started:
+            return None
+
+        job = cls.model.objects.get(pk=job_id)
+        try:
+            analytics = OrderItemAnalytics(cls.items(job)).summary(months=True)
+            charts = {}
+            if analytics.total_items:
+                charts = render_charts(
+                    analytics, settings.CHARTS_ROOT, fmt=job.image_format
+                )
+        except Exception as exc:
+            job.status = cls.model.Status.FAILED
+            job.error = repr(exc)
+            job.finished_at = timezone.now()
+            job.save(update_fields=["status", "error", "finished_at"])
+            raise
+
+        job.charts = {name: chart.key for name, chart in charts.items()}
+        job.total_items = analytics.total_items
+        job.status = cls.model.Status.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=["charts", "total_items", "status", "finished_at"])
+
+        evict_charts(
+            settings.CHARTS_ROOT,
+            max_bytes=settings.CHARTS_CACHE_MAX_BYTES,
+            max_age=settings.CHARTS_CACHE_MAX_AGE,
+            keep=set(job.charts.values()),
+        )
+        return job
+
+    @classmethod
+    def chart_path(cls, job, name):
+        key = job.charts.get(name)
+        if key is None:
+            return None
+        return chart_object_path(settings.CHARTS_ROOT, key, job.image_format)
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class OrderExportService:
+    """
+    Выгрузка всех позиций заказов магазина для бухгалтерии. Строки
+    читаются одним запросом с JOIN через iterator() (на PostgreSQL —
+    серверный курсор) и сразу превращаются в текст, поэтому память не
+    растет с числом заказов.
+    """
+
+    chunk_size = 2000
+    columns = (
+        ("order_number", "order__number"),
+        ("order_created_at", "order__created_at"),
+        ("user_id", "order__user_id"),
+        ("user_email", "order__user__email"),
+        ("font", "font_face_with_price__face__font__name"),
+        ("style", "font_face_with_price__face__style__name"),
+        ("license_type", "font_face_with_price__license_type"),
+        ("price", "font_face_with_price__price"),
+        ("currency", "font_face_with_price__currency"),
+    )
+    content_types = {
+        "csv": "text/csv; charset=utf-8",
+        "ndjson": "application/x-ndjson",
+    }
+
+    @classmethod
+    def header(cls):
+        return [name for name, _ in cls.columns]
+
+    @classmethod
+    def queryset(cls, date_from=None, date_to=None):
+        items = _created_between(OrderItem.objects.all(), date_from, date_to)
+        return items.order_by("order__created_at", "order_id", "pk").values_list(
+            *(lookup for _, lookup in cls.columns)
+        )
+
+    @classmethod
+    def rows(cls, date_from=None, date_to=None, chunk_size=None):
+        return cls.queryset(date_from, date_to).iterator(
+            chunk_size=chunk_size or cls.chunk_size
+        )
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        if value is None:
+            return None
+        if isinstance(value, int):
+            return value
+        return str(value)
+
+    @classmethod
+    def csv_lines(cls, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(cls.header())
+        for row in rows:
+            yield writer.writerow(
+                ["" if value is None else cls._value(value) for value in row]
+            )
+
+    @classmethod
+    def ndjson_lines(cls, rows):
+        header = cls.header()
+        for row in rows:
+            record = dict(zip(header, (cls._value(value) for value in row)))
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    @classmethod
+    def lines(cls, export_format, date_from=None, date_to=None, chunk_size=None):
+        rows = cls.rows(date_from, date_to, chunk_size)
+        if export_format == "ndjson":
+            return cls.ndjson_lines(rows)
+        return cls.csv_lines(rows)
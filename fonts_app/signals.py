@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Font, FontStyle, FontFace, FontFacePrice, Order, OrderItem
+from .service import OrderRollupService
+from .tasks import refresh_price_rollups
+
+
+def invalidate_catalog(sender, **kwargs):
+    # Только после коммита: иначе параллельный запрос успеет прочитать
+    # старые строки и закэшировать их под новой версией.
+    transaction.on_commit(bump_catalog_version)
+
+
+def touch_font(sender, instance, **kwargs):
+    # Font.updated_at отмечает шрифты, изменившиеся после последней
+    # выгрузки каталога (см. команду export_catalog).
+    if sender is FontStyle:
+        fonts = Font.objects.filter(fontface__style=instance)
+    elif sender is FontFace:
+        fonts = Font.objects.filter(pk=instance.font_id)
+    else:
+        fonts = Font.objects.filter(fontface__pk=instance.face_id)
+    fonts.update(updated_at=timezone.now())
+
+
+for model in (Font, FontStyle, FontFace, FontFacePrice):
+    post_save.connect(invalidate_catalog, sender=model)
+    post_delete.connect(invalidate_catalog, sender=model)
+
+for model in (FontStyle, FontFace, FontFacePrice):
+    post_save.connect(touch_font, sender=model)
+    post_delete.connect(touch_font, sender=model)
+
+
+def remember_order_owner(sender, instance, **kwargs):
+    # Прежние владелец и дата нужны post_save, чтобы пересчитать и их день.
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        instance._rollup_previous = (
+            Order.objects.filter(pk=instance.pk)
+            .values_list("user_id", "created_at")
+            .first()
+        )
+
+
+def refresh_order_rollups(sender, instance, created=False, **kwargs):
+    # Новые заказы create_from_cart учитывает в сводке сам; здесь - правка,
+    # удаление (в том числе каскадом) и отвязка от пользователя.
+    if created and sender is Order:
+        return
+    if sender is OrderItem:
+        order = Order.objects.filter(pk=instance.order_id).first()
+        days = {(order.user_id, order.created_at)} if order else set()
+    else:
+        days = {(instance.user_id, instance.created_at)}
+        if getattr(instance, "_rollup_previous", None):
+            days.add(instance._rollup_previous)
+    for user_id, created_at in days:
+        if user_id is not None and created_at is not None:
+            OrderRollupService.refresh_day(
+                user_id, OrderRollupService.day_of(created_at)
+            )
+
+
+pre_save.connect(remember_order_owner, sender=Order)
+for model in (Order, OrderItem):
+    post_save.connect(refresh_order_rollups, sender=model)
+    post_delete.connect(refresh_order_rollups, sender=model)
+
+
+ROLLUP_PRICE_FIELDS = ("price", "license_type", "face_id")
+
+
+def remember_price(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        instance._rollup_previous = (
+            FontFacePrice.objects.filter(pk=instance.pk)
+            .values_list(*ROLLUP_PRICE_FIELDS)
+            .first()
+        )
+
+
+def reprice_rollups(sender, instance, created, **kwargs):
+    # Сводки хранят выручку и разрез по позиции: после смены цены, типа
+    # лицензии или начертания пересчитываем дни, когда ее покупали. Дней
+    # может быть много, поэтому в Celery и только после коммита.
+    previous = getattr(instance, "_rollup_previous", None)
+    current = tuple(getattr(instance, field) for field in ROLLUP_PRICE_FIELDS)
+    if created or previous is None or previous == current:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: refresh_price_rollups.delay(pk))
+
+
+pre_save.connect(remember_price, sender=FontFacePrice)
+post_save.connect(reprice_rollups, sender=FontFacePrice)
@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from .service import ChartRenderService, OrderRollupService
+
+
+@shared_task
+def render_order_charts(job_id):
+    ChartRenderService.run(job_id)
+
+
+@shared_task
+def refresh_price_rollups(price_id):
+    OrderRollupService.refresh_price(price_id)
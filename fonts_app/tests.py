@@ -1,3 +1,1683 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import (
+    LiveServerTestCase,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, reverse
+from djangoProject.celery import app as celery_app
+from djangoProject.db_router import STICKY_COOKIE, ReplicaRouter, replica_reads
+from djangoProject.metrics import Histogram
+from djangoProject.nplusone import NPlusOneError, detect_nplusone, fingerprint
+from rest_framework.request import Request
+from rest_framework.serializers import Serializer
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from users.authentication import user_cache
+
+from .analytics import OrderItemAnalytics, RollupAnalytics, pandas_summary
+from .bench import seed_catalog, seed_orders
+from .charts import ROW_FIELDS, evict_charts, summarize_rows
+from .pagination import OrderPagination
+from .service import (
+    CacheCartStorage,
+    CartService,
+    GuestCart,
+    OrderExportService,
+    OrderRollupService,
+    OrderService,
+)
+from .views import (
+    AllFontsView,
+    AllLicensesView,
+    GetFontLicensesView,
+    GetLicensesByStyleView,
+    UserOrdersView,
+)
+from .models import (
+    Cart,
+    ChartRenderJob,
+    Font,
+    FontStyle,
+    FontFace,
+    FontFacePrice,
+    LicenseType,
+    Order,
+    OrderItem,
+    UserOrderRollup,
+)
+
+
+def make_catalog(fonts=2, styles=2):
+    prices = []
+    style_objs = [FontStyle.objects.create(name=f"Style {i}") for i in range(styles)]
+    for i in range(fonts):
+        font = Font.objects.create(name=f"Font {i}", author="Author", desc="Desc")
+        for style in style_objs:
+            face = FontFace.objects.create(font=font, style=style)
+            for license_type in (LicenseType.DESKTOP5, LicenseType.APP1):
+                prices.append(
+                    FontFacePrice.objects.create(
+                        face=face, license_type=license_type, price=Decimal("100.00")
+                    )
+                )
+    return prices
+
+
+def make_guest_cart(prices):
+    cart = GuestCart(uuid.uuid4())
+    CacheCartStorage().add_items(cart, [price.pk for price in prices])
+    return cart
+
+
+def make_orders(user, prices, count):
+    orders = []
+    for _ in range(count):
+        order = Order.objects.create(user=user)
+        for price in prices[:2]:
+            OrderItem.objects.create(order=order, font_face_with_price=price)
+        orders.append(order)
+    return orders
+
+
+class CatalogCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.prices = make_catalog()
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse("all_licenses")
+
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.json(), second.json())
+
+    def test_catalog_write_invalidates_cached_responses(self):
+        url = reverse("get_license", kwargs={"pk_font": self.prices[0].face.font_id})
+        self.client.get(url)
+
+        price = self.prices[0]
+        price.price = Decimal("150.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            price.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("150.00", [item["price"] for item in response.json()])
+
+    def test_version_is_bumped_only_after_commit(self):
+        url = reverse("all_licenses")
+        self.client.get(url)
+
+        price = self.prices[0]
+        price.price = Decimal("150.00")
+        with self.captureOnCommitCallbacks() as callbacks:
+            price.save()
+            # До коммита ответ из кэша прежний, новая версия еще не выдана.
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.assertTrue(callbacks)
+
+        for callback in callbacks:
+            callback()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("150.00", [item["price"] for item in response.json()])
+
+    def test_fonts_payload_has_no_export_bookkeeping(self):
+        fonts = self.client.get(reverse("all_fonts")).json()
+        self.assertNotIn("updated_at", fonts[0])
+
+    def test_stats_count_hits_and_misses(self):
+        url = reverse("all_fonts")
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(url)
+
+        admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        self.client.force_authenticate(admin)
+        stats = self.client.get(reverse("catalog_cache_stats")).json()
+
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+
+
+class ExportCatalogTests(APITestCase):
+    def setUp(self):
+        self.prices = make_catalog()
+        self.out_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.out_dir)
+
+    def export(self):
+        call_command("export_catalog", out_dir=str(self.out_dir), stdout=StringIO())
+
+    def test_export_matches_api_and_writes_compressed_variants(self):
+        self.export()
+
+        font_id = self.prices[0].face.font_id
+        exported = json.loads(
+            (self.out_dir / "get-license" / f"{font_id}.json").read_text()
+        )
+        response = self.client.get(reverse("get_license", kwargs={"pk_font": font_id}))
+
+        self.assertEqual(exported, response.json())
+        for name in ("all-fonts.json", "all-licenses.json"):
+            for suffix in ("", ".gz", ".br"):
+                self.assertTrue((self.out_dir / (name + suffix)).exists())
+
+    def test_incremental_export_only_rewrites_touched_fonts(self):
+        self.export()
+        untouched, touched = Font.objects.order_by("pk")
+        untouched_path = self.out_dir / "get-license" / f"{untouched.pk}.json"
+        untouched_path.unlink()
+
+        price = FontFacePrice.objects.filter(face__font=touched).first()
+        price.price = Decimal("250.00")
+        price.save()
+        self.export()
+
+        self.assertFalse(untouched_path.exists())
+        exported = json.loads(
+            (self.out_dir / "get-license" / f"{touched.pk}.json").read_text()
+        )
+        self.assertIn("250.00", [item["price"] for item in exported])
+
+    def test_deleted_font_files_are_removed(self):
+        self.export()
+        font = Font.objects.first()
+        font.delete()
+        self.export()
+
+        self.assertFalse((self.out_dir / "get-license" / f"{font.pk}.json").exists())
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.prices = make_catalog(fonts=3, styles=2)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+
+    def walk(self, url, page_size):
+        ids = []
+        response = self.client.get(url, {"page_size": page_size})
+        while True:
+            body = response.json()
+            ids.extend(item["id"] for item in body["results"])
+            if body["next"] is None:
+                return ids
+            response = self.client.get(body["next"])
+
+    def test_list_is_not_paginated_without_parameters(self):
+        response = self.client.get(reverse("all_licenses"))
+        self.assertEqual(len(response.json()), len(self.prices))
+
+    def test_catalog_pages_cover_every_row_in_id_order(self):
+        ids = self.walk(reverse("all_licenses"), page_size=5)
+        self.assertEqual(ids, sorted(price.pk for price in self.prices))
+
+    def test_orders_are_paged_newest_first(self):
+        orders = make_orders(self.user, self.prices, 5)
+        self.client.force_authenticate(self.user)
+
+        ids = self.walk(reverse("user_orders"), page_size=2)
+
+        self.assertEqual(ids, [order.pk for order in reversed(orders)])
+
+    def test_cached_next_link_does_not_leak_host(self):
+        url = reverse("all_licenses")
+        self.client.get(url, {"page_size": 5}, HTTP_HOST="internal:8000")
+        response = self.client.get(url, {"page_size": 5}, secure=True)
+
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertTrue(response.json()["next"].startswith(f"{url}?"))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse("all_fonts"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+class UserOrdersQueryBudgetTests(APITestCase):
+    QUERY_BUDGET = 2
+
+    def setUp(self):
+        self.prices = make_catalog(fonts=3, styles=2)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("user_orders"), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_order_history(self):
+        make_orders(self.user, self.prices, 1)
+        few = self.count_queries()
+
+        make_orders(self.user, self.prices, 50)
+        many = self.count_queries()
+
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, self.QUERY_BUDGET)
+
+    def test_paginated_query_count_is_constant(self):
+        make_orders(self.user, self.prices, 30)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            self.client.get(reverse("user_orders"), {"page_size": 20})
+
+    def test_items_carry_font_and_style(self):
+        make_orders(self.user, self.prices, 1)
+        item = self.client.get(reverse("user_orders")).json()[0]["items"][0]
+        self.assertEqual(item["font_face_with_price"]["font_name"], "Font 0")
+        self.assertEqual(item["font_face_with_price"]["style_name"], "Style 0")
+
+    def test_anonymous_user_is_rejected(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse("user_orders"))
+        self.assertIn(response.status_code, (401, 403))
+
+
+class CreateOrderTests(APITestCase):
+    def setUp(self):
+        caches["carts"].clear()
+        self.prices = make_catalog(fonts=3, styles=2)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+
+    def make_cart(self, prices, user=None):
+        cart = Cart.objects.create(user=user)
+        cart.items.add(*prices)
+        return cart
+
+    def test_guest_checkout_deletes_only_own_cart(self):
+        cart = make_guest_cart(self.prices[:3])
+        other = make_guest_cart(self.prices[3:4])
+        self.client.cookies["cart_id"] = str(cart.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("create_order"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), 3)
+        self.assertIsNone(response.json()["user"])
+        self.assertIsNone(CacheCartStorage().get(cart.pk))
+        self.assertIsNotNone(CacheCartStorage().get(other.pk))
+
+    def test_guest_cart_is_checked_out_once(self):
+        cart = make_guest_cart(self.prices[:3])
+        self.client.cookies["cart_id"] = str(cart.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("create_order"))
+        response = self.client.post(reverse("create_order"))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_logged_in_checkout_takes_guest_cart_items(self):
+        cart = make_guest_cart(self.prices[:2])
+        self.client.cookies["cart_id"] = str(cart.pk)
+        self.client.force_authenticate(self.user)
+
+        response = self.client.post(reverse("create_order"))
+
+        self.assertEqual(response.json()["user"], self.user.pk)
+        self.assertEqual(len(response.json()["items"]), 2)
+
+    def test_idempotency_key_returns_original_order(self):
+        self.make_cart(self.prices[:2], user=self.user)
+        self.client.force_authenticate(self.user)
+        headers = {"HTTP_IDEMPOTENCY_KEY": "checkout-1"}
+
+        first = self.client.post(reverse("create_order"), **headers)
+        second = self.client.post(reverse("create_order"), **headers)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json()["number"], second.json()["number"])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_checkout_keeps_guest_cart(self):
+        cart = make_guest_cart(self.prices[:2])
+        with mock.patch.object(
+            OrderItem.objects, "bulk_create", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                OrderService.create_from_cart(cart)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(len(CacheCartStorage().get(cart.pk).item_ids), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order, created = OrderService.create_from_cart(cart)
+        self.assertTrue(created)
+        self.assertEqual(order.items.count(), 2)
+        self.assertIsNone(CacheCartStorage().get(cart.pk))
+
+    def test_idempotency_key_is_scoped_per_user(self):
+        self.make_cart(self.prices[:2], user=self.user)
+        self.client.force_authenticate(self.user)
+        first = self.client.post(
+            reverse("create_order"), HTTP_IDEMPOTENCY_KEY="checkout-1"
+        )
+
+        other = get_user_model().objects.create_user(
+            username="other", email="other@example.com", password="pass"
+        )
+        self.make_cart(self.prices[2:3], user=other)
+        self.client.force_authenticate(other)
+        response = self.client.post(
+            reverse("create_order"), HTTP_IDEMPOTENCY_KEY="checkout-1"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"], other.pk)
+        self.assertNotEqual(response.json()["number"], first.json()["number"])
+        self.assertEqual(len(response.json()["items"]), 1)
+
+    def test_guest_order_is_replayed_only_for_the_same_cart(self):
+        cart = make_guest_cart(self.prices[:2])
+        self.client.cookies["cart_id"] = str(cart.pk)
+        headers = {"HTTP_IDEMPOTENCY_KEY": "checkout-1"}
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(reverse("create_order"), **headers)
+        second = self.client.post(reverse("create_order"), **headers)
+        self.assertEqual(first.json()["number"], second.json()["number"])
+
+        self.client.cookies["cart_id"] = str(uuid.uuid4())
+        self.assertEqual(
+            self.client.post(reverse("create_order"), **headers).status_code, 400
+        )
+        del self.client.cookies["cart_id"]
+        self.assertEqual(
+            self.client.post(reverse("create_order"), **headers).status_code, 400
+        )
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_retry_gets_original_order(self):
+        cart = self.make_cart(self.prices[:2], user=self.user)
+        self.client.force_authenticate(self.user)
+
+        def lock_after_first_commit(request, create=False):
+            # Первый запрос с тем же ключом оформил корзину, пока этот ждал
+            # select_for_update: строки корзины уже нет.
+            OrderService.create_from_cart(cart, idempotency_key="checkout-1")
+            return None, False
+
+        with mock.patch.object(
+            CartService, "get_cart_for_update", side_effect=lock_after_first_commit
+        ):
+            response = self.client.post(
+                reverse("create_order"), HTTP_IDEMPOTENCY_KEY="checkout-1"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["number"], str(Order.objects.get().number))
+
+    def test_concurrent_guest_retry_waits_for_first_checkout(self):
+        cart = make_guest_cart(self.prices[:2])
+        self.client.cookies["cart_id"] = str(cart.pk)
+        storage = CacheCartStorage()
+        # Первый запрос занял корзину, его заказ еще не закоммичен.
+        storage.cache.add(storage.checkout_key(cart.pk), 1)
+        orders = []
+
+        def first_commits(seconds):
+            if not orders:
+                orders.append(
+                    Order.objects.create(idempotency_key=f"guest:{cart.pk}:checkout-1")
+                )
+                storage.cache.delete_many(
+                    [storage.key(cart.pk), storage.checkout_key(cart.pk)]
+                )
+
+        with mock.patch("fonts_app.service.time.sleep", side_effect=first_commits):
+            response = self.client.post(
+                reverse("create_order"), HTTP_IDEMPOTENCY_KEY="checkout-1"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["number"], str(orders[0].number))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_write_count_does_not_depend_on_cart_size(self):
+        self.client.force_authenticate(self.user)
+
+        def checkout(prices):
+            self.make_cart(prices, user=self.user)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse("create_order"))
+            return len(queries)
+
+        self.assertEqual(checkout(self.prices[:1]), checkout(self.prices[:10]))
+        self.assertEqual(OrderItem.objects.count(), 11)
+
+
+class CartMutationTests(APITestCase):
+    def setUp(self):
+        caches["carts"].clear()
+        self.prices = make_catalog(fonts=3, styles=2)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+
+    def add(self, price):
+        return self.client.post(reverse("add_to_cart", kwargs={"pk_item": price.pk}))
+
+    def remove(self, price):
+        return self.client.delete(
+            reverse("remove_from_cart", kwargs={"pk_item": price.pk})
+        )
+
+    def test_guest_cart_is_kept_out_of_the_database(self):
+        response = self.add(self.prices[0])
+        self.client.cookies["cart_id"] = response.cookies["cart_id"].value
+        self.add(self.prices[0])
+        self.add(self.prices[1])
+
+        items = self.client.get(reverse("cart")).json()["items"]
+        self.assertEqual(
+            [item["id"] for item in items], [self.prices[0].pk, self.prices[1].pk]
+        )
+        self.assertFalse(Cart.objects.exists())
+
+    def test_guest_remove(self):
+        cart = make_guest_cart(self.prices[:2])
+        self.client.cookies["cart_id"] = str(cart.pk)
+
+        response = self.remove(self.prices[0])
+
+        self.assertEqual(len(response.json()["items"]), 1)
+        self.assertEqual(CacheCartStorage().get(cart.pk).item_ids, {self.prices[1].pk})
+
+    def test_concurrent_guest_adds_are_not_lost(self):
+        class SlowStorage(CacheCartStorage):
+            # Пауза между чтением и записью: без блокировки запись
+            # одного потока затирала бы добавленное другим.
+            def stored_ids(self, cart_id):
+                item_ids = super().stored_ids(cart_id)
+                time.sleep(0.002)
+                return item_ids
+
+        cart_id = make_guest_cart(self.prices[:1]).pk
+        item_ids = [price.pk for price in self.prices[1:]]
+        barrier = threading.Barrier(len(item_ids))
+
+        def add(item_id):
+            barrier.wait()
+            SlowStorage().update(GuestCart(cart_id), add=[item_id])
+
+        threads = [threading.Thread(target=add, args=(pk,)) for pk in item_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            CacheCartStorage().get(cart_id).item_ids,
+            {price.pk for price in self.prices},
+        )
+
+    @override_settings(GUEST_CART_STORAGE="fonts_app.service.ORMCartStorage")
+    def test_orm_guest_storage_counts_each_item_once(self):
+        response = self.add(self.prices[0])
+        self.client.cookies["cart_id"] = response.cookies["cart_id"].value
+        self.add(self.prices[0])
+        self.add(self.prices[1])
+
+        cart = Cart.objects.get()
+        self.assertEqual(cart.items.count(), 2)
+        self.assertEqual(cart.sum, Decimal("200.00"))
+
+    def test_remove_decrements_sum(self):
+        self.client.force_authenticate(self.user)
+        self.add(self.prices[0])
+        self.add(self.prices[1])
+
+        response = self.remove(self.prices[0])
+
+        self.assertEqual(len(response.json()["items"]), 1)
+        self.assertEqual(Cart.objects.get(user=self.user).sum, Decimal("100.00"))
+
+    def test_remove_without_cart_is_not_found(self):
+        self.assertEqual(self.remove(self.prices[0]).status_code, 404)
+
+    def test_unknown_item_is_not_found(self):
+        response = self.client.post(reverse("add_to_cart", kwargs={"pk_item": 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_guest_cart_is_merged_into_user_cart(self):
+        user_cart = Cart.objects.create(user=self.user, sum=Decimal("100.00"))
+        user_cart.items.add(self.prices[0])
+        guest_cart = make_guest_cart(self.prices[:2])
+
+        self.client.cookies["cart_id"] = str(guest_cart.pk)
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add(self.prices[2])
+
+        cart = Cart.objects.get()
+        self.assertEqual(cart.pk, user_cart.pk)
+        self.assertEqual(cart.items.count(), 3)
+        self.assertEqual(cart.sum, Decimal("300.00"))
+        self.assertIsNone(CacheCartStorage().get(guest_cart.pk))
+
+    def test_login_persists_guest_cart(self):
+        guest_cart = make_guest_cart(self.prices[:2])
+        self.client.cookies["cart_id"] = str(guest_cart.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("users:login_token_custom"),
+                {"email": "buyer@example.com", "password": "pass"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Cart.objects.get(user=self.user).items.count(), 2)
+        self.assertIsNone(CacheCartStorage().get(guest_cart.pk))
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.client.force_authenticate(self.user)
+
+        def merge_and_add(guest_items):
+            Cart.objects.filter(user=self.user).delete()
+            Cart.objects.create(user=self.user).items.add(self.prices[-1])
+            guest_cart = make_guest_cart(guest_items)
+            self.client.cookies["cart_id"] = str(guest_cart.pk)
+            with CaptureQueriesContext(connection) as queries:
+                self.add(self.prices[0])
+            return len(queries)
+
+        self.assertEqual(
+            merge_and_add(self.prices[1:2]), merge_and_add(self.prices[1:20])
+        )
+
+
+class MergeDuplicateCartsTests(TransactionTestCase):
+    """Данные до uniq_cart_user: ограничение снимается на время теста."""
+
+    def setUp(self):
+        self.prices = make_catalog(fonts=2, styles=1)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+        (self.constraint,) = Cart._meta.constraints
+        # SQLite пересоздает таблицу по Meta.constraints, убираем его и оттуда.
+        with mock.patch.object(Cart._meta, "constraints", []):
+            with connection.schema_editor() as editor:
+                editor.remove_constraint(Cart, self.constraint)
+        self.constraint_added = False
+        self.addCleanup(self.add_constraint, cleanup=True)
+
+    def add_constraint(self, cleanup=False):
+        if cleanup:
+            if self.constraint_added:
+                return
+            Cart.objects.all().delete()
+        with connection.schema_editor() as editor:
+            editor.add_constraint(Cart, self.constraint)
+        self.constraint_added = True
+
+    def make_cart(self, user, prices):
+        cart = Cart.objects.create(user=user, sum=sum(p.price for p in prices))
+        cart.items.add(*prices)
+        return cart
+
+    def test_merges_carts_before_constraint(self):
+        self.make_cart(self.user, self.prices[:2])
+        self.make_cart(self.user, self.prices[1:3])
+        other = get_user_model().objects.create_user(
+            username="other", email="other@example.com", password="pass"
+        )
+        self.make_cart(other, self.prices[:1])
+        self.make_cart(None, self.prices[:1])
+        self.make_cart(None, self.prices[:1])
+
+        out = StringIO()
+        call_command("merge_duplicate_carts", stdout=out)
+
+        self.assertIn("Duplicate carts merged: 1", out.getvalue())
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(
+            sorted(cart.items.values_list("pk", flat=True)),
+            [price.pk for price in self.prices[:3]],
+        )
+        self.assertEqual(cart.sum, Decimal("300.00"))
+        self.assertEqual(Cart.objects.filter(user=other).count(), 1)
+        self.assertEqual(Cart.objects.filter(user__isnull=True).count(), 2)
+        # Ограничение, как в migrate, теперь применяется.
+        self.add_constraint()
+        self.assertEqual(Cart.objects.count(), 4)
+
+
+class CartBatchTests(APITestCase):
+    def setUp(self):
+        caches["carts"].clear()
+        self.prices = make_catalog(fonts=1, styles=12)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def batch(self, add=(), remove=()):
+        return self.client.post(
+            reverse("cart_batch"),
+            {"add": [p.pk for p in add], "remove": [p.pk for p in remove]},
+            format="json",
+        )
+
+    def test_adds_and_removes_in_one_request(self):
+        self.batch(add=self.prices[:3])
+
+        response = self.batch(add=self.prices[3:5], remove=self.prices[:1])
+
+        self.assertEqual(
+            [item["id"] for item in response.json()["items"]],
+            [price.pk for price in self.prices[1:5]],
+        )
+        self.assertEqual(Cart.objects.get(user=self.user).sum, Decimal("400.00"))
+
+    def test_whole_family_costs_a_fixed_number_of_queries(self):
+        def count(prices):
+            Cart.objects.filter(user=self.user).delete()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(add=prices)
+            self.assertEqual(len(response.json()["items"]), len(prices))
+            return len(queries)
+
+        self.assertEqual(count(self.prices[:1]), count(self.prices))
+
+    def test_unknown_item_rolls_back_the_batch(self):
+        response = self.client.post(
+            reverse("cart_batch"), {"add": [self.prices[0].pk, 0]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_guest_batch_sets_cookie(self):
+        self.client.force_authenticate(None)
+        response = self.batch(add=self.prices[:12])
+
+        self.assertIn("cart_id", response.cookies)
+        self.assertEqual(len(response.json()["items"]), 12)
+
+
+class OrderRollupTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.prices = make_catalog(fonts=2, styles=2)
+        self.admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        self.client.force_authenticate(self.admin)
+
+    def checkout(self, prices):
+        self.client.post(
+            reverse("cart_batch"), {"add": [p.pk for p in prices]}, format="json"
+        )
+        return self.client.post(reverse("create_order"))
+
+    def analytics(self):
+        return self.client.get(reverse("user_orders_analytics")).json()
+
+    def test_checkout_updates_rollups(self):
+        self.checkout(self.prices[:3])
+        self.checkout(self.prices[:1])
+
+        data = self.analytics()
+
+        self.assertEqual(data["total_items"], 4)
+        self.assertEqual(data["revenue_total"], 400.0)
+        self.assertEqual(data["by_font"], {"Font 0": 4})
+        self.assertEqual(data["by_style"], {"Style 0": 3, "Style 1": 1})
+        self.assertEqual(
+            data["by_license"],
+            {LicenseType.DESKTOP5.label: 3, LicenseType.APP1.label: 1},
+        )
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.checkout(self.prices[:3])
+        self.checkout(self.prices[2:6])
+        incremental = self.analytics()
+
+        call_command("rebuild_order_rollups", stdout=StringIO())
+
+        self.assertEqual(self.analytics(), incremental)
+
+    def test_deleting_orders_and_items_updates_rollups(self):
+        first = self.checkout(self.prices[:3]).json()
+        second = self.checkout(self.prices[:1]).json()
+
+        OrderItem.objects.filter(order_id=first["id"]).first().delete()
+        self.assertEqual(self.analytics()["total_items"], 3)
+
+        Order.objects.get(pk=first["id"]).delete()
+        self.assertEqual(self.analytics()["total_items"], 1)
+
+        order = Order.objects.get(pk=second["id"])
+        order.user = None
+        order.save()
+        self.assertFalse(UserOrderRollup.objects.exists())
+
+    def test_price_change_reprices_rollups(self):
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", eager)
+        self.checkout(self.prices[:2])
+        self.checkout(self.prices[1:3])
+
+        price = self.prices[1]
+        price.price = Decimal("1100.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            price.save()
+
+        reference = OrderItemAnalytics.for_user(self.admin).summary()
+        self.assertEqual(self.analytics()["revenue_total"], 2400.0)
+        self.assertEqual(
+            self.analytics()["revenue_total"], reference.as_response()["revenue_total"]
+        )
+
+    def test_analytics_without_orders(self):
+        self.assertEqual(
+            self.analytics(),
+            {
+                "total_items": 0,
+                "by_font": {},
+                "by_license": {},
+                "by_style": {},
+                "revenue_total": 0,
+            },
+        )
+
+    def test_query_count_does_not_grow_with_history(self):
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.analytics()
+            return len(queries)
+
+        self.checkout(self.prices[:1])
+        few = count()
+        for _ in range(5):
+            self.checkout(self.prices)
+        self.assertEqual(few, count())
+
+
+class OrderAnalyticsParityTests(APITestCase):
+    def setUp(self):
+        random.seed(1)
+        prices = seed_catalog(fonts=6, styles=3)
+        User = get_user_model()
+        self.users = [
+            User.objects.create(username=f"u{i}", email=f"u{i}@example.com")
+            for i in range(3)
+        ]
+        seed_orders(self.users, 40, prices, items_per_order=4)
+        OrderRollupService.rebuild()
+
+    def ordered(self, analytics):
+        # Списки, а не словари: ответ упорядочен, порядок тоже сравниваем.
+        return {
+            name: list(getattr(analytics, name).items())
+            for name in ("by_font", "by_license", "by_style", "by_month")
+        }
+
+    def assert_same(self, sql, reference):
+        self.assertEqual(sql.total_items, reference.total_items)
+        self.assertEqual(self.ordered(sql), self.ordered(reference))
+        self.assertEqual(
+            round(float(sql.revenue_total), 2), round(reference.revenue_total, 2)
+        )
+        self.assertEqual(
+            [(k, round(float(v), 2)) for k, v in sql.revenue_by_month.items()],
+            [(k, round(v, 2)) for k, v in reference.revenue_by_month.items()],
+        )
+
+    def test_sql_aggregation_matches_pandas(self):
+        for user in self.users:
+            items = OrderItem.objects.filter(order__user=user)
+            self.assert_same(
+                OrderItemAnalytics(items).summary(months=True), pandas_summary(items)
+            )
+
+    def test_rollups_match_pandas(self):
+        for user in self.users:
+            items = OrderItem.objects.filter(order__user=user)
+            self.assert_same(
+                RollupAnalytics.for_user(user).summary(months=True),
+                pandas_summary(items),
+            )
+
+    def test_view_matches_pandas_response(self):
+        user = self.users[0]
+        user.is_staff = True
+        user.save()
+        self.client.force_authenticate(user)
+
+        response = self.client.get(reverse("user_orders_analytics")).json()
+
+        reference = pandas_summary(OrderItem.objects.filter(order__user=user))
+        self.assertEqual(response, reference.as_response())
+        for name in ("by_font", "by_license", "by_style"):
+            self.assertEqual(
+                list(response[name].items()), list(getattr(reference, name).items())
+            )
+
+    def test_plot_command_renders_charts(self):
+        out_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, out_dir)
+
+        call_command(
+            "plot_user_orders_analytics",
+            user_id=self.users[0].pk,
+            out_dir=str(out_dir),
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(len(list(out_dir.glob("*.png"))), 5)
+
+    def test_summary_from_rows_matches_sql(self):
+        for user in self.users:
+            items = OrderItem.objects.filter(order__user=user)
+            rows = summarize_rows(items.values_list(*ROW_FIELDS))
+            sql = OrderItemAnalytics(items).summary(months=True)
+            self.assertEqual(rows, sql)
+            self.assertEqual(self.ordered(rows), self.ordered(sql))
+
+    def plot_batch(self, out_dir=None, **options):
+        if out_dir is None:
+            out_dir = Path(tempfile.mkdtemp())
+            self.addCleanup(shutil.rmtree, out_dir)
+        out = StringIO()
+        call_command(
+            "plot_user_orders_analytics",
+            out_dir=str(out_dir),
+            stdout=out,
+            **options,
+        )
+        self.output = out.getvalue()
+        return out_dir
+
+    def test_plot_command_all_users_in_process(self):
+        import matplotlib.pyplot as plt
+
+        with self.assertNumQueries(1):
+            out_dir = self.plot_batch(all_users=True, workers=1)
+
+        self.assertEqual(len(list(out_dir.glob("*.png"))), 5 * len(self.users))
+        self.assertEqual(plt.get_fignums(), [])
+
+    def test_plot_command_user_ids_in_process_pool(self):
+        user_ids = [self.users[0].pk, self.users[2].pk]
+
+        out_dir = self.plot_batch(user_ids=user_ids, workers=2)
+
+        self.assertEqual(
+            {path.name.split("_")[1] for path in out_dir.glob("*.png")},
+            {str(user_id) for user_id in user_ids},
+        )
+        self.assertEqual(len(list(out_dir.glob("*.png"))), 10)
+
+    def test_unchanged_charts_are_reused(self):
+        out_dir = self.plot_batch(all_users=True, workers=1)
+        self.assertIn("rendered: 15, reused: 0", self.output)
+        objects = sorted((out_dir / "objects").iterdir())
+
+        self.plot_batch(out_dir, all_users=True, workers=1)
+
+        self.assertIn("rendered: 0, reused: 15", self.output)
+        self.assertEqual(sorted((out_dir / "objects").iterdir()), objects)
+        manifest = json.loads((out_dir / "manifest.json").read_text())
+        link = out_dir / f"user_{self.users[0].pk}_by_font.png"
+        self.assertTrue(link.is_symlink())
+        self.assertEqual(
+            link.resolve().stem,
+            manifest[f"user_{self.users[0].pk}"][link.name],
+        )
+
+    def test_changed_series_is_rerendered(self):
+        out_dir = self.plot_batch(user_ids=[self.users[0].pk], workers=1)
+        order = Order.objects.filter(user=self.users[0]).first()
+        OrderItem.objects.create(
+            order=order, font_face_with_price=FontFacePrice.objects.first()
+        )
+
+        self.plot_batch(out_dir, user_ids=[self.users[0].pk], workers=1)
+
+        # Меняются хотя бы счетчики по месяцам и выручка, остальные могут совпасть.
+        rendered = int(self.output.split("rendered: ")[1].split(",")[0])
+        self.assertGreaterEqual(rendered, 2)
+        self.assertEqual(
+            rendered + int(self.output.split("reused: ")[1].split(",")[0]), 5
+        )
+
+    def test_eviction_by_size_and_age(self):
+        out_dir = self.plot_batch(user_ids=[self.users[0].pk], workers=1)
+        keys = {path.stem for path in (out_dir / "objects").iterdir()}
+        keep = sorted(keys)[0]
+
+        self.assertEqual(evict_charts(out_dir, max_age=3600), set())
+        self.assertEqual(evict_charts(out_dir, max_bytes=0, keep={keep}), keys - {keep})
+
+        self.assertEqual(
+            [path.stem for path in (out_dir / "objects").iterdir()], [keep]
+        )
+        self.assertEqual(len(list(out_dir.glob("*.png"))), 1)
+        manifest = json.loads((out_dir / "manifest.json").read_text())
+        self.assertEqual(list(manifest[f"user_{self.users[0].pk}"].values()), [keep])
+
+        old = time.time() - 7200
+        os.utime(out_dir / "objects" / f"{keep}.png", (old, old))
+        self.assertEqual(evict_charts(out_dir, max_age=3600), {keep})
+        self.assertEqual(json.loads((out_dir / "manifest.json").read_text()), {})
+
+
+class ChartRenderJobTests(APITestCase):
+    def setUp(self):
+        charts_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, charts_root)
+        self.enterContext(override_settings(CHARTS_ROOT=charts_root))
+        self.charts_root = charts_root
+
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", eager)
+
+        random.seed(2)
+        prices = seed_catalog(fonts=4, styles=2)
+        User = get_user_model()
+        self.customer = User.objects.create(username="c", email="c@example.com")
+        seed_orders([self.customer], 20, prices, items_per_order=3)
+        self.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        self.client.force_authenticate(self.admin)
+
+    def queue(self, run=True, **data):
+        data.setdefault("user_id", self.customer.pk)
+        with self.captureOnCommitCallbacks(execute=run):
+            response = self.client.post(reverse("chart_jobs"), data, format="json")
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_request_only_queues_the_job(self):
+        job = self.queue(run=False)
+
+        self.assertEqual(job["status"], "pending")
+        self.assertEqual(
+            ChartRenderJob.objects.get(pk=job["id"]).status,
+            ChartRenderJob.Status.PENDING,
+        )
+        image = self.client.get(reverse("chart_job_image", args=[job["id"], "by_font"]))
+        self.assertEqual(image.status_code, 202)
+
+    def test_rendered_png_is_served_and_reused(self):
+        job_id = self.queue()["id"]
+
+        job = self.client.get(reverse("chart_job", args=[job_id])).json()
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["total_items"], 60)
+        self.assertEqual(
+            set(job["charts"]),
+            {"by_font", "by_license", "by_style", "by_month", "revenue_by_month"},
+        )
+
+        response = self.client.get(job["charts"]["by_font"])
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"\x89PNG"))
+
+        objects = sorted((self.charts_root / "objects").iterdir())
+        second = self.queue()
+        self.assertEqual(
+            ChartRenderJob.objects.get(pk=second["id"]).charts,
+            ChartRenderJob.objects.get(pk=job_id).charts,
+        )
+        self.assertEqual(sorted((self.charts_root / "objects").iterdir()), objects)
+        self.assertEqual(
+            self.client.get(
+                reverse("chart_job_image", args=[job_id, "missing"])
+            ).status_code,
+            404,
+        )
+
+    def test_svg_for_date_range(self):
+        last_order = Order.objects.filter(user=self.customer).latest("created_at")
+        day = last_order.created_at.astimezone(datetime.timezone.utc).date()
+
+        job_id = self.queue(
+            date_from=day.isoformat(), date_to=day.isoformat(), image_format="svg"
+        )["id"]
+
+        job = ChartRenderJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, ChartRenderJob.Status.DONE)
+        start = datetime.datetime.combine(
+            day, datetime.time.min, tzinfo=datetime.timezone.utc
+        )
+        expected = OrderItem.objects.filter(
+            order__user=self.customer,
+            order__created_at__gte=start,
+            order__created_at__lt=start + datetime.timedelta(days=1),
+        ).count()
+        self.assertGreater(expected, 0)
+        self.assertEqual(job.total_items, expected)
+        response = self.client.get(
+            reverse("chart_job_image", args=[job_id, "by_license"])
+        )
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        self.assertIn(b"<svg", b"".join(response.streaming_content))
+
+    def test_empty_range_and_validation(self):
+        job = self.queue(date_from="2000-01-01", date_to="2000-01-31")
+        job = self.client.get(reverse("chart_job", args=[job["id"]])).json()
+        self.assertEqual(
+            (job["status"], job["total_items"], job["charts"]), ("done", 0, {})
+        )
+
+        response = self.client.post(
+            reverse("chart_jobs"),
+            {
+                "user_id": self.customer.pk,
+                "date_from": "2024-02-01",
+                "date_to": "2024-01-01",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(
+            reverse("chart_jobs"), {"user_id": self.customer.pk}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_wsgi_startup_does_not_import_analytics_dependencies(self):
+        out = StringIO()
+        call_command("profile_imports", forbid=["pandas", "matplotlib"], stdout=out)
+        self.assertIn("djangoProject.wsgi", out.getvalue())
+
+    def test_forbidden_import_is_reported(self):
+        with self.assertRaisesMessage(CommandError, "rest_framework"):
+            call_command(
+                "profile_imports", forbid=["rest_framework"], stdout=StringIO()
+            )
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        random.seed(3)
+        prices = seed_catalog(fonts=3, styles=2)
+        User = get_user_model()
+        self.users = [
+            User.objects.create(username=f"e{i}", email=f"e{i}@example.com")
+            for i in range(2)
+        ]
+        seed_orders(self.users, 15, prices, items_per_order=2)
+        self.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse("orders_export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            body = b"".join(response.streaming_content).decode()
+        return response, body
+
+    def test_csv_streams_every_item_in_one_query(self):
+        response, body = self.export()
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(len(rows), OrderItem.objects.count())
+        item = OrderItem.objects.select_related(
+            "order__user", "font_face_with_price__face__font"
+        ).get(
+            order__number=rows[0]["order_number"],
+            font_face_with_price__face__font__name=rows[0]["font"],
+            font_face_with_price__face__style__name=rows[0]["style"],
+            font_face_with_price__license_type=rows[0]["license_type"],
+        )
+        self.assertEqual(rows[0]["user_email"], item.order.user.email)
+        self.assertEqual(rows[0]["price"], str(item.font_face_with_price.price))
+        self.assertEqual(
+            [row["order_created_at"] for row in rows],
+            sorted(row["order_created_at"] for row in rows),
+        )
+
+    def test_ndjson_with_date_range(self):
+        last = Order.objects.latest("created_at").created_at
+        day = last.astimezone(datetime.timezone.utc).date()
+
+        response, body = self.export(
+            export_format="ndjson", date_from=day.isoformat(), date_to=day.isoformat()
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertTrue(records)
+        self.assertEqual(
+            {record["order_created_at"][:10] for record in records}, {day.isoformat()}
+        )
+
+    def test_validation_and_permissions(self):
+        response = self.client.get(
+            reverse("orders_export"),
+            {"date_from": "2024-02-01", "date_to": "2024-01-01"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get(reverse("orders_export")).status_code, 403)
+
+    def test_command_matches_endpoint(self):
+        _, body = self.export(export_format="ndjson")
+        out = StringIO()
+
+        call_command("export_orders", format="ndjson", chunk_size=7, stdout=out)
+
+        self.assertEqual(out.getvalue(), body)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN checks need PostgreSQL")
+class QueryPlanTests(APITestCase):
+    """
+    Планы запросов списков и аналитики из views.py. Последовательное
+    сканирование запрещено (enable_seqscan = off), поэтому Seq Scan в плане
+    остается только там, где для фильтра или сортировки нет индекса.
+    """
+
+    # Справочник начертаний маленький, его полное чтение не регрессия.
+    small_tables = {FontStyle._meta.db_table}
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(4)
+        cls.prices = seed_catalog(fonts=300, styles=4)
+        User = get_user_model()
+        cls.users = User.objects.bulk_create(
+            User(username=f"plan{i}", email=f"plan{i}@example.com") for i in range(20)
+        )
+        seed_orders(cls.users, 50, cls.prices, items_per_order=3)
+        OrderRollupService.rebuild()
+        cls.cart = Cart.objects.create(user=cls.users[0])
+        cls.cart.items.add(*cls.prices[:5])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute("RESET enable_seqscan")
+
+    def querysets(self):
+        user = self.users[0]
+        face = self.prices[0].face
+        page = settings.KEYSET_PAGE_SIZE + 1
+        request = Request(APIRequestFactory().get("/"))
+        request.user = user
+
+        orders_view = UserOrdersView(request=request)
+        orders = orders_view.get_queryset().order_by(*OrderPagination.ordering)
+        order_ids = list(orders.values_list("pk", flat=True)[:page])
+        day = orders.first().created_at.date()
+
+        return {
+            "all_fonts": AllFontsView.queryset.order_by("id").filter(
+                id__gt=face.font_id
+            )[:page],
+            "all_licenses": AllLicensesView.queryset.order_by("id").filter(
+                id__gt=self.prices[100].pk
+            )[:page],
+            "get_license": GetFontLicensesView(
+                kwargs={"pk_font": face.font_id}
+            ).get_queryset(),
+            "get_licenses_by_face": GetLicensesByStyleView(
+                kwargs={"pk_face": face.pk}
+            ).get_queryset(),
+            "cart": Cart.objects.filter(user=user),
+            "cart_items": FontFacePrice.objects.filter(cart=self.cart),
+            "user_orders": orders[:page],
+            "user_orders_items": OrderItem.objects.filter(order_id__in=order_ids),
+            "user_orders_analytics": RollupAnalytics.for_user(user).queryset.values(
+                "font__name"
+            ),
+            "order_items_by_user": OrderItemAnalytics.for_user(user).queryset,
+            "orders_export": OrderExportService.queryset(day, day),
+        }
+
+    def seq_scans(self, plan):
+        found = []
+        if plan.get("Node Type") == "Seq Scan":
+            if plan["Relation Name"] not in self.small_tables:
+                found.append(plan["Relation Name"])
+        for child in plan.get("Plans", []):
+            found += self.seq_scans(child)
+        return found
+
+    def test_no_sequential_scans(self):
+        for name, queryset in self.querysets().items():
+            with self.subTest(name):
+                raw = queryset.explain(format="json")
+                plan = json.loads(raw)[0]["Plan"]
+                self.assertEqual(self.seq_scans(plan), [], raw)
+
+
+class BenchmarkCommandsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        caches["carts"].clear()
+
+    def test_seed_benchmark_data(self):
+        call_command(
+            "seed_benchmark_data",
+            fonts=3,
+            styles=2,
+            users=4,
+            carts=2,
+            cart_items=3,
+            orders_per_user=2,
+            items_per_order=2,
+            seed=1,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(Font.objects.count(), 3)
+        self.assertEqual(FontFace.objects.count(), 6)
+        self.assertEqual(FontFacePrice.objects.count(), 6 * len(LicenseType.values))
+        self.assertEqual(get_user_model().objects.count(), 4)
+        self.assertEqual(Cart.items.through.objects.count(), 6)
+        self.assertEqual(Order.objects.count(), 8)
+        self.assertEqual(OrderItem.objects.count(), 16)
+        self.assertEqual(
+            UserOrderRollup.objects.aggregate(total=Sum("items_count"))["total"], 16
+        )
+
+    def test_run_benchmarks_covers_every_url(self):
+        call_command(
+            "seed_benchmark_data", fonts=3, styles=2, users=2, seed=1, stdout=StringIO()
+        )
+        output = Path(tempfile.mkdtemp()) / "bench.json"
+        self.addCleanup(shutil.rmtree, output.parent)
+
+        call_command("run_benchmarks", repeat=2, output=str(output), stdout=StringIO())
+
+        report = json.loads(output.read_text())
+        self.assertEqual(report["missing"], [])
+        for label, result in report["results"].items():
+            with self.subTest(label):
+                self.assertTrue(
+                    all(int(code) < 500 for code in result["status"].split(",")),
+                    result,
+                )
+                self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+                self.assertIn("queries", result)
+                self.assertIn("alloc_kib", result)
+        # Прогон не оставляет своих данных.
+        self.assertEqual(get_user_model().objects.count(), 2)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        make_catalog()
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("all_fonts"))
+
+        timing = response["Server-Timing"]
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertRegex(
+            timing,
+            r"^db;dur=[\d.]+;.*, serialize;dur=[\d.]+, render;dur=[\d.]+,"
+            r" total;dur=[\d.]+$",
+        )
+
+    def test_serialize_timing_covers_serializers(self):
+        # Сериализаторы работают во view, до рендера ответа.
+        to_representation = Serializer.to_representation
+
+        def slow_representation(serializer, instance):
+            time.sleep(0.02)
+            return to_representation(serializer, instance)
+
+        with mock.patch.object(Serializer, "to_representation", slow_representation):
+            response = self.client.get(reverse("all_fonts"))
+
+        timing = response["Server-Timing"]
+        serialize = float(re.search(r"serialize;dur=([\d.]+)", timing).group(1))
+        render = float(re.search(r"render;dur=([\d.]+)", timing).group(1))
+        self.assertGreaterEqual(serialize, 20 * Font.objects.count())
+        self.assertLess(render, 20)
+
+    def test_histogram_shards_per_thread(self):
+        histogram = Histogram("test_seconds", "Test.", (0.1, 1))
+
+        def worker():
+            for value in (0.05, 0.5, 5):
+                histogram.observe(value, view="v")
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(histogram._shards), 4)
+        self.assertEqual(histogram.collect()[(("view", "v"),)], [4, 4, 4, 22.2])
+        lines = histogram.expose()
+        self.assertIn('test_seconds_bucket{view="v",le="1"} 8', lines)
+        self.assertIn('test_seconds_bucket{view="v",le="+Inf"} 12', lines)
+        self.assertIn('test_seconds_count{view="v"} 12', lines)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("all_fonts"))
+        self.client.get(reverse("all_fonts"))
+
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+        admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        self.client.force_login(admin)
+        body = self.client.get("/metrics").content.decode()
+
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        self.assertRegex(
+            body,
+            r'http_request_duration_seconds_count\{method="GET",status="2xx",'
+            r'view="all_fonts"\} [1-9]',
+        )
+        self.assertIn("http_request_db_queries_bucket{", body)
+        self.assertIn("catalog_cache_hits_total ", body)
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_metrics_token(self):
+        self.assertEqual(
+            self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code,
+            403,
+        )
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+
+@override_settings(NPLUSONE_ENABLED=True, NPLUSONE_RAISE=True, NPLUSONE_THRESHOLD=5)
+class NPlusOneTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.prices = make_catalog(fonts=4, styles=2)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT *  FROM t WHERE id IN (%s, %s, %s) AND name = 'a''b'"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ?",
+        )
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 1"),
+            fingerprint("SELECT * FROM t WHERE id = 22"),
+        )
+
+    def test_detects_lazy_relation_in_loop(self):
+        with self.assertRaises(NPlusOneError) as ctx:
+            with detect_nplusone("faces"):
+                [face.font.name for face in FontFace.objects.all()]
+
+        message = str(ctx.exception)
+        self.assertIn("N+1 queries in faces", message)
+        self.assertIn("8 x fonts_app/tests.py:", message)
+        self.assertIn('FROM "fonts_app_font"', message)
+
+        with detect_nplusone("faces") as tracker:
+            [face.font.name for face in FontFace.objects.select_related("font")]
+        self.assertEqual(tracker.problems(), [])
+
+    @override_settings(NPLUSONE_RAISE=False)
+    def test_logs_instead_of_raising(self):
+        with self.assertLogs("djangoProject.nplusone", "WARNING") as logs:
+            with detect_nplusone("faces"):
+                [face.style.name for face in FontFace.objects.all()]
+        self.assertIn('FROM "fonts_app_fontstyle"', logs.output[0])
+
+    def test_endpoints_have_no_nplusone(self):
+        make_orders(self.user, self.prices, 6)
+        self.client.force_authenticate(self.user)
+        for price in self.prices[:6]:
+            self.client.post(reverse("add_to_cart", args=[price.pk]))
+
+        for name in ("all_fonts", "all_licenses", "cart", "user_orders"):
+            with self.subTest(name):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+
+def use_async_views(enabled=True):
+    """Перестраивает fonts_app.urls так, как при ASYNC_VIEWS=enabled."""
+    from djangoProject import urls as root_urls
+
+    from . import urls
+
+    with override_settings(ASYNC_VIEWS=enabled):
+        importlib.reload(urls)
+    # В корневом urls.py остался resolver include() с прежним списком путей.
+    importlib.reload(root_urls)
+    clear_url_caches()
+
+
+class AsyncViewsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.prices = make_catalog(fonts=3, styles=2)
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+        self.auth = {
+            "headers": {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        }
+        self.addCleanup(use_async_views, False)
+
+    def compare(self, url, **headers):
+        """JSON sync-версии (DRF под WSGI) и async-версии (под ASGI)."""
+        cache.clear()
+        expected = self.client.get(url, **headers)
+        use_async_views()
+        cache.clear()
+        actual = async_to_sync(self.async_client.get)(url, **headers)
+        use_async_views(False)
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(actual.json(), expected.json())
+        return actual
+
+    def test_catalog_matches_sync_views(self):
+        face = FontFace.objects.first()
+        for url in (
+            reverse("all_fonts"),
+            reverse("all_fonts") + "?page_size=2",
+            reverse("all_licenses") + "?page_size=5",
+            reverse("get_license", args=[face.font_id]),
+            reverse("get_styles_and_licenses", args=[face.pk]),
+        ):
+            with self.subTest(url):
+                self.compare(url)
+
+        response = self.compare(reverse("all_licenses") + "?cursor=bad")
+        self.assertEqual(response.status_code, 404)
+
+    def test_catalog_cache_is_shared(self):
+        use_async_views()
+        url = reverse("all_fonts")
+        first = async_to_sync(self.async_client.get)(url)
+        second = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.json(), second.json())
+
+    def test_cart_matches_sync_view(self):
+        for price in self.prices[:3]:
+            self.client.post(reverse("add_to_cart", args=[price.pk]), **self.auth)
+
+        response = self.compare(reverse("cart"), **self.auth)
+        self.assertEqual(len(response.json()["items"]), 3)
+
+        guest = make_guest_cart(self.prices[:2])
+        self.client.cookies["cart_id"] = str(guest.pk)
+        self.async_client.cookies["cart_id"] = str(guest.pk)
+        response = self.compare(reverse("cart"))
+        self.assertEqual(len(response.json()["items"]), 2)
+
+    def test_cart_rejects_deactivated_user(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        use_async_views()
+        response = async_to_sync(self.async_client.get)(reverse("cart"), **self.auth)
+        self.assertEqual(response.status_code, 401)
+
+    def test_query_metrics_under_asgi(self):
+        # Запросы async ORM и sync view выполняются не в потоке event loop.
+        make_orders(self.user, self.prices, 1)
+        use_async_views()
+        for url, headers in (
+            (reverse("all_licenses"), {}),
+            (reverse("user_orders"), self.auth),
+        ):
+            with self.subTest(url):
+                response = async_to_sync(self.async_client.get)(url, **headers)
+                self.assertEqual(response.status_code, 200)
+                timing = response["Server-Timing"]
+                queries = int(re.search(r'desc="(\d+) queries"', timing).group(1))
+                self.assertGreater(queries, 0)
+                self.assertIn("serialize;dur=", timing)
+
+
+class ConcurrencyBenchmarkTests(LiveServerTestCase):
+    def test_benchmark_concurrency(self):
+        make_catalog()
+        url = self.live_server_url + reverse("all_fonts")
+        out = StringIO()
+        call_command(
+            "benchmark_concurrency",
+            url=[url],
+            clients=4,
+            requests=8,
+            slow_ms=20,
+            stdout=out,
+        )
+        row = out.getvalue().splitlines()[-1].split()
+        self.assertEqual(row[0], url)
+        self.assertEqual(row[-1], "0")
+
+
+@override_settings(DATABASE_REPLICA="test_replica")
+class ReplicaRoutingTests(APITestCase):
+    """Реплика - вторая SQLite-база test_replica с той же схемой, но пустая."""
+
+    databases = {"default", "test_replica"}
+
+    def setUp(self):
+        caches["carts"].clear()
+        self.prices = make_catalog(fonts=1, styles=1)
+        self.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="pass"
+        )
+        make_orders(self.user, self.prices, 1)
+        self.client.force_authenticate(self.user)
+
+    def test_reads_use_replica_until_first_write(self):
+        self.assertEqual(Order.objects.count(), 1)
+        with replica_reads():
+            self.assertEqual(Order.objects.count(), 0)
+            # Пользователи не из fonts_app, их читаем с основной базы.
+            self.assertTrue(get_user_model().objects.filter(pk=self.user.pk).exists())
+            order = Order.objects.create(user=self.user)
+            self.assertEqual(order._state.db, "default")
+            self.assertEqual(Order.objects.count(), 2)
+
+    def test_replica_is_not_migrated(self):
+        self.assertFalse(ReplicaRouter().allow_migrate("test_replica", "fonts_app"))
+        self.assertIsNone(ReplicaRouter().allow_migrate("default", "fonts_app"))
+
+    def test_order_history_reads_replica(self):
+        response = self.client.get(reverse("user_orders"))
+
+        self.assertEqual(response.json(), [])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_new_order_is_visible_right_after_checkout(self):
+        Cart.objects.create(user=self.user).items.add(self.prices[0])
+
+        response = self.client.post(reverse("create_order"))
+        self.assertEqual(response.status_code, 200)
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.DATABASE_STICKY_SECONDS)
+
+        orders = self.client.get(reverse("user_orders")).json()
+        self.assertIn(response.json()["id"], [order["id"] for order in orders])
+
+        del self.client.cookies[STICKY_COOKIE]
+        self.assertEqual(self.client.get(reverse("user_orders")).json(), [])
+
+    def test_catalog_cache_is_filled_from_primary(self):
+        cache.clear()
+        self.addCleanup(use_async_views, False)
+        url = reverse("all_licenses")
+        # Правка каталога подняла версию, а реплика (пустая) ее еще не получила.
+        price = self.prices[0]
+        price.price = Decimal("150.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            price.save()
+
+        for async_views in (False, True):
+            cache.clear()
+            use_async_views(async_views)
+            for expected in ("MISS", "HIT"):
+                if async_views:
+                    response = async_to_sync(self.async_client.get)(url)
+                else:
+                    response = self.client.get(url)
+                self.assertEqual(response["X-Cache"], expected)
+                self.assertIn("150.00", [item["price"] for item in response.json()])
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     GetFontLicensesView,
@@ -6,12 +7,28 @@ from .views import (
     AddToCartView,
     AllFontsView,
     CartView,
+    CartBatchView,
     RemoveFromCartView,
     CreateOrderView,
     UserOrdersView,
     UserOrdersAnalyticsView,
+    OrderExportView,
+    CatalogCacheStatsView,
+    ChartRenderJobsView,
+    ChartRenderJobView,
+    ChartRenderJobImageView,
 )
 
+if settings.ASYNC_VIEWS:
+    # Под ASGI (run_asgi.sh) чтение каталога и корзины - async view.
+    from .async_views import (
+        AsyncAllFontsView as AllFontsView,
+        AsyncAllLicensesView as AllLicensesView,
+        AsyncCartView as CartView,
+        AsyncGetFontLicensesView as GetFontLicensesView,
+        AsyncGetLicensesByStyleView as GetLicensesByStyleView,
+    )
+
 urlpatterns = [
     path("all-fonts/", AllFontsView.as_view(), name="all_fonts"),
     path("all-licenses/", AllLicensesView.as_view(), name="all_licenses"),
@@ -23,8 +40,14 @@ urlpatterns = [
         GetLicensesByStyleView.as_view(),
         name="get_styles_and_licenses",
     ),
+    path(
+        "catalog-cache-stats/",
+        CatalogCacheStatsView.as_view(),
+        name="catalog_cache_stats",
+    ),
     path("add-to-cart/<int:pk_item>/", AddToCartView.as_view(), name="add_to_cart"),
     path("cart/", CartView.as_view(), name="cart"),
+    path("cart/batch/", CartBatchView.as_view(), name="cart_batch"),
     path(
         "remove-from-cart/<int:pk_item>/",
         RemoveFromCartView.as_view(),
@@ -37,4 +60,12 @@ urlpatterns = [
         UserOrdersAnalyticsView.as_view(),
         name="user_orders_analytics",
     ),
+    path("orders-export/", OrderExportView.as_view(), name="orders_export"),
+    path("chart-jobs/", ChartRenderJobsView.as_view(), name="chart_jobs"),
+    path("chart-jobs/<uuid:pk>/", ChartRenderJobView.as_view(), name="chart_job"),
+    path(
+        "chart-jobs/<uuid:pk>/<str:chart>/",
+        ChartRenderJobImageView.as_view(),
+        name="chart_job_image",
+    ),
 ]
@@ -1,25 +1,39 @@
-import uuid
-import pandas as pd
-from rest_framework.permissions import IsAdminUser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import FontFacePrice, Cart, Font, Order, OrderItem, LicenseType
+from .models import ChartRenderJob, FontFacePrice, Cart, Font, Order
 from .serializers import (
     FontFacePriceSerializer,
     FontSerializer,
     CartSerializer,
+    CartBatchSerializer,
+    ChartRenderJobCreateSerializer,
+    ChartRenderJobSerializer,
+    OrderExportSerializer,
     OrderSerializer,
 )
 
 from django.conf import settings
+from django.db import transaction
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 
-from .service import CartService
+from users.authentication import stateless_authentication_classes
+
+from .analytics import RollupAnalytics
+from .service import (
+    CartService,
+    ChartRenderService,
+    OrderExportService,
+    OrderService,
+)
+from .cache import CatalogCacheMixin, catalog_cache_stats
+from .pagination import CatalogPagination, OrderPagination
 
 
 @ensure_csrf_cookie
@@ -27,13 +41,24 @@ def csrf(request):
     return JsonResponse({"detail": "CSRF cookie set"})
 
 
-class AllFontsView(ListAPIView):
+def set_cart_cookie(response, cart):
+    response.set_cookie(
+        key="cart_id",
+        value=cart.pk,
+        httponly=True,
+        secure=True if settings.DEBUG else False,
+        samesite="Lax",
+    )
+
+
+class AllFontsView(CatalogCacheMixin, ListAPIView):
     model = Font
     serializer_class = FontSerializer
     queryset = Font.objects.all()
+    pagination_class = CatalogPagination
 
 
-class GetFontLicensesView(ListAPIView):
+class GetFontLicensesView(CatalogCacheMixin, ListAPIView):
     model = FontFacePrice
     serializer_class = FontFacePriceSerializer
 
@@ -45,16 +70,17 @@ class GetFontLicensesView(ListAPIView):
         ).filter(face__font__pk=pk_font)
 
 
-class AllLicensesView(ListAPIView):
+class AllLicensesView(CatalogCacheMixin, ListAPIView):
     model = FontFacePrice
     serializer_class = FontFacePriceSerializer
+    pagination_class = CatalogPagination
     queryset = FontFacePrice.objects.select_related(
         "face__font",
         "face__style",
     ).all()
 
 
-class GetLicensesByStyleView(ListAPIView):
+class GetLicensesByStyleView(CatalogCacheMixin, ListAPIView):
     model = FontFacePrice
     serializer_class = FontFacePriceSerializer
 
@@ -66,24 +92,26 @@ class GetLicensesByStyleView(ListAPIView):
         ).filter(face__pk=pk_face)
 
 
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache_stats(), status=status.HTTP_200_OK)
+
+
 class RemoveFromCartView(APIView):
     model = Cart
+    authentication_classes = stateless_authentication_classes()
     serializer_class = CartSerializer
 
     def delete(self, request, pk_item):
-        user = request.user
-        cart_id_from_cookies = request.COOKIES.get("cart_id")
-
-        cart = None
-        if user.is_authenticated:
-            cart = self.model.objects.filter(user=user).first()
-
-        if cart_id_from_cookies and cart is None:
-            cart = self.model.objects.filter(pk=cart_id_from_cookies).first()
-
-        cart.items.remove(pk_item)
-        cart.save()
+        with transaction.atomic():
+            cart, _ = CartService.get_cart_for_update(request)
+            if cart is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            CartService.remove_items(cart, [pk_item])
 
+        CartService.load_items(cart)
         data = self.serializer_class(cart)
 
         return Response(data.data, status=status.HTTP_200_OK)
@@ -91,63 +119,68 @@ class RemoveFromCartView(APIView):
 
 class AddToCartView(APIView):
     model = Cart
+    authentication_classes = stateless_authentication_classes()
 
     def post(self, request, pk_item):
-        cart_id_from_cookies = request.COOKIES.get("cart_id")
-        user = request.user
         response = Response(status=status.HTTP_200_OK)
 
-        if user.is_authenticated and cart_id_from_cookies:
-            cart = self.model.objects.filter(pk=cart_id_from_cookies).first()
-            cart.user = user
-            cart.save()
-
-        cart = None
-        if user.is_authenticated:
-            cart = self.model.objects.filter(user=user).first()
-        elif cart_id_from_cookies:
-            cart = self.model.objects.filter(pk=cart_id_from_cookies).first()
+        try:
+            with transaction.atomic():
+                cart, created = CartService.get_cart_for_update(request, create=True)
+                CartService.add_items(cart, [pk_item])
+        except FontFacePrice.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
 
-        if cart:
-            if FontFacePrice.objects.get(pk=pk_item) not in cart.items.all():
-                cart.sum += FontFacePrice.objects.get(pk=pk_item).price
+        if created:
+            set_cart_cookie(response, cart)
 
-            cart.items.add(pk_item)
-            cart.save()
-
-            return response
+        return response
 
-        if user.is_authenticated:
-            cart = self.model.objects.create(
-                pk=uuid.uuid4(),
-                user=user,
-            )
-        else:
-            cart = self.model.objects.create(pk=uuid.uuid4())
 
-        if FontFacePrice.objects.get(pk=pk_item) not in cart.items.all():
-            cart.sum += FontFacePrice.objects.get(pk=pk_item).price
+class CartBatchView(APIView):
+    """
+    Добавляет и удаляет несколько позиций корзины одним запросом и одной
+    транзакцией: {"add": [id, ...], "remove": [id, ...]}. Удаление
+    применяется после добавления.
+    """
 
-        cart.items.add(pk_item)
-        cart.save()
+    model = Cart
+    authentication_classes = stateless_authentication_classes()
+    serializer_class = CartSerializer
 
-        response.set_cookie(
-            key="cart_id",
-            value=cart.pk,
-            httponly=True,
-            secure=True if settings.DEBUG else False,
-            samesite="Lax",
-        )
+    def post(self, request):
+        batch = CartBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        add = batch.validated_data["add"]
+        remove = batch.validated_data["remove"]
+
+        try:
+            with transaction.atomic():
+                cart, created = CartService.get_cart_for_update(
+                    request, create=bool(add)
+                )
+                if cart is None:
+                    return Response(status=status.HTTP_404_NOT_FOUND)
+                CartService.add_items(cart, add)
+                CartService.remove_items(cart, remove)
+        except FontFacePrice.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        CartService.load_items(cart)
+        response = Response(self.serializer_class(cart).data, status=status.HTTP_200_OK)
+        if created:
+            set_cart_cookie(response, cart)
 
         return response
 
 
 class CartView(APIView):
     model = Cart
+    authentication_classes = stateless_authentication_classes()
     serializer_class = CartSerializer
 
     def get(self, request):
-        cart = CartService.get_cart_object(request)
+        cart = CartService.get_cart_object(request, with_items=True)
 
         data = self.serializer_class(cart)
 
@@ -155,33 +188,59 @@ class CartView(APIView):
 
 
 class CreateOrderView(APIView):
-    def post(self, request):
-        cart = CartService.get_cart_object(request)
+    authentication_classes = stateless_authentication_classes()
+    idempotency_header = "Idempotency-Key"
 
-        if cart is None:
+    def post(self, request):
+        user_id = request.user.pk if request.user.is_authenticated else None
+        key = self.idempotency_key(request, user_id)
+        if key is not None and len(key) > 255:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        order = Order.objects.create(
-            user=cart.user,
-        )
-
-        for item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                font_face_with_price=item,
-            )
+        if key is not None:
+            order = OrderService.get_by_idempotency_key(user_id, key)
+            if order is not None:
+                return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+
+        with transaction.atomic():
+            cart, _ = CartService.get_cart_for_update(request)
+
+            order = None
+            if cart is not None:
+                order, _ = OrderService.create_from_cart(cart, idempotency_key=key)
+            if order is None and key is not None:
+                # Повтор с тем же ключом ждал блокировку корзины, пока первый
+                # запрос оформлял ее: корзины уже нет, заказ закоммичен.
+                order = OrderService.get_by_idempotency_key(user_id, key)
+        if order is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        Cart.objects.filter(user=cart.user).delete()
+        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
 
-        return Response(status=status.HTTP_200_OK)
+    def idempotency_key(self, request, user_id):
+        key = request.headers.get(self.idempotency_header) or None
+        if key is None or user_id is not None:
+            return key
+        # Гость опознается только по cookie корзины: без нее повтор заказа
+        # не отдаем, иначе чужой гостевой заказ получил бы любой с тем же ключом.
+        cart_id = CartService._cart_id_from_cookies(request)
+        if cart_id is None:
+            return None
+        return f"guest:{cart_id}:{key}"
 
 
 class UserOrdersView(ListAPIView):
     model = Order
     serializer_class = OrderSerializer
+    pagination_class = OrderPagination
+    permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return self.model.objects.filter(user=self.request.user)
+        # Заказы и все их позиции вместе с шрифтом и начертанием грузятся
+        # двумя запросами, сколько бы заказов ни было у пользователя.
+        return OrderService.with_items(
+            self.model.objects.filter(user=self.request.user)
+        )
 
 
 class UserOrdersAnalyticsView(APIView):
@@ -191,64 +250,81 @@ class UserOrdersAnalyticsView(APIView):
         if not request.user.is_authenticated:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
-        qs = (
-            OrderItem.objects.select_related(
-                "order",
-                "font_face_with_price__face__font",
-                "font_face_with_price__face__style",
-            )
-            .filter(order__user=request.user, font_face_with_price__isnull=False)
-            .values(
-                "order__created_at",
-                "font_face_with_price__license_type",
-                "font_face_with_price__price",
-                "font_face_with_price__face__font__name",
-                "font_face_with_price__face__style__name",
-            )
-        )
+        # Читаем предрасчитанные сводки (UserOrderRollup): объем работы
+        # зависит от числа групп, а не от всей истории заказов.
+        analytics = RollupAnalytics.for_user(request.user).summary()
+
+        return Response(analytics.as_response(), status=status.HTTP_200_OK)
 
-        df = pd.DataFrame.from_records(qs)
-        if df.empty:
-            return Response(
-                {
-                    "total_items": 0,
-                    "by_font": {},
-                    "by_license": {},
-                    "by_style": {},
-                    "revenue_total": 0,
-                },
-                status=status.HTTP_200_OK,
-            )
 
-        license_map = dict(LicenseType.choices)
-        df["license_type_label"] = df["font_face_with_price__license_type"].map(
-            license_map
+class OrderExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        serializer = OrderExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        export_format = serializer.validated_data.pop("export_format")
+
+        response = StreamingHttpResponse(
+            OrderExportService.lines(export_format, **serializer.validated_data),
+            content_type=OrderExportService.content_types[export_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="orders.{export_format}"'
         )
+        return response
 
-        df["price"] = df["font_face_with_price__price"].astype(float)
-        df["font_name"] = df["font_face_with_price__face__font__name"].astype(str)
-        df["style_name"] = df["font_face_with_price__face__style__name"].astype(str)
 
-        by_font = df.groupby("font_name").size().sort_values(ascending=False).to_dict()
-        by_license = (
-            df.groupby("license_type_label")
-            .size()
-            .sort_values(ascending=False)
-            .to_dict()
+class ChartRenderJobsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = ChartRenderJobCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Рисует воркер Celery, поток uWSGI только ставит задачу в очередь.
+        job = ChartRenderService.queue(
+            requested_by=request.user, **serializer.validated_data
         )
-        by_style = (
-            df.groupby("style_name").size().sort_values(ascending=False).to_dict()
+
+        return Response(
+            ChartRenderJobSerializer(job, context={"request": request}).data,
+            status=status.HTTP_202_ACCEPTED,
         )
 
-        revenue_total = round(float(df["price"].sum()), 2)
 
+class ChartRenderJobView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ChartRenderJob, pk=pk)
         return Response(
-            {
-                "total_items": int(len(df)),
-                "by_font": by_font,
-                "by_license": by_license,
-                "by_style": by_style,
-                "revenue_total": revenue_total,
-            },
+            ChartRenderJobSerializer(job, context={"request": request}).data,
             status=status.HTTP_200_OK,
         )
+
+
+class ChartRenderJobImageView(APIView):
+    permission_classes = [IsAdminUser]
+    content_types = {"png": "image/png", "svg": "image/svg+xml"}
+
+    def get(self, request, pk, chart):
+        job = get_object_or_404(ChartRenderJob, pk=pk)
+
+        if job.status != ChartRenderJob.Status.DONE:
+            data = ChartRenderJobSerializer(job, context={"request": request}).data
+            if job.status == ChartRenderJob.Status.FAILED:
+                return Response(data, status=status.HTTP_409_CONFLICT)
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+
+        path = ChartRenderService.chart_path(job, chart)
+        if path is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        try:
+            image = open(path, "rb")
+        except FileNotFoundError:
+            return Response(
+                {"detail": "График удален из кеша, поставьте задачу заново"},
+                status=status.HTTP_410_GONE,
+            )
+        return FileResponse(image, content_type=self.content_types[job.image_format])
@@ -0,0 +1,24 @@
+#!/bin/sh
+
+set -e
+
+uv run manage.py wait_for_db
+uv run manage.py makemigrations
+# Одна корзина на пользователя (uniq_cart_user): сливаем дубли до migrate.
+uv run manage.py merge_duplicate_carts
+uv run manage.py migrate
+uv run manage.py collectstatic --noinput
+
+# Async-версии каталога и корзины (fonts_app.async_views).
+export ASYNC_VIEWS=True
+
+# В отличие от run_uwsgi.sh, здесь HTTP, а не протокол uwsgi:
+# в nginx proxy_pass http://app:9000 вместо uwsgi_pass.
+exec uvicorn djangoProject.asgi:application \
+  --host 0.0.0.0 \
+  --port 9000 \
+  --workers 1 \
+  --lifespan off \
+  --proxy-headers \
+  --forwarded-allow-ips "*" \
+  --no-access-log
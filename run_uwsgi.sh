@@ -4,6 +4,8 @@ set -e
 
 uv run manage.py wait_for_db
 uv run manage.py makemigrations
+# Одна корзина на пользователя (uniq_cart_user): сливаем дубли до migrate.
+uv run manage.py merge_duplicate_carts
 uv run manage.py migrate
 uv run manage.py collectstatic --noinput
 
@@ -0,0 +1,216 @@
+"""
+Аутентификация по JWT без лишних запросов к БД.
+
+CachedJWTAuthentication берет пользователя из кэша процесса (TTLCache):
+ограниченного по размеру LRU с TTL. Запись удаляется при сохранении или
+удалении пользователя (users.signals), но только в том процессе, где это
+произошло, - в остальных воркерах она доживает до USER_CACHE_TTL секунд.
+Изменения через QuerySet.update() сигналов не вызывают и тоже видны
+только по истечении TTL.
+
+StatelessJWTAuthentication совсем не читает пользователя: для view,
+которым нужен только id (корзина, оформление заказа), request.user -
+TokenUser из claims токена. Деактивированные пользователи отсекаются по
+отметке в общем кэше (mark_inactive), которую ставит тот же сигнал.
+
+CachedBasicAuthentication запоминает успешную проверку пароля на
+BASIC_AUTH_CACHE_TTL секунд: ключ - HMAC логина и пароля на SECRET_KEY,
+значение - pk и хеш пароля пользователя. Если хеш у пользователя уже
+другой (пароль сменили) или он деактивирован, пароль проверяется заново.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication,
+    JWTStatelessUserAuthentication,
+)
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class TTLCache:
+    """LRU на maxsize записей, каждая живет ttl секунд. Общий для потоков процесса."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        with self._lock:
+            entry = self._data.get(pk)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._data[pk]
+                return None
+            self._data.move_to_end(pk)
+        # Копия: view может менять request.user, а запись общая для потоков.
+        return copy.copy(user)
+
+    def set(self, pk, user):
+        with self._lock:
+            self._data[pk] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._data.move_to_end(pk)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._data.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+credential_cache = TTLCache(
+    settings.BASIC_AUTH_CACHE_SIZE, settings.BASIC_AUTH_CACHE_TTL
+)
+
+
+def get_cached_user(pk):
+    """Пользователь по pk из кэша процесса или из БД; None, если его нет."""
+    user_model = get_user_model()
+    pk = user_model._meta.pk.to_python(pk)
+    user = user_cache.get(pk)
+    if user is None:
+        user = user_model.objects.filter(pk=pk).first()
+        if user is not None:
+            user_cache.set(pk, user)
+    return user
+
+
+def inactive_key(pk):
+    return f"users:inactive:{pk}"
+
+
+def mark_inactive(pk):
+    # Отметка живет, пока могут быть действительны выданные до нее access-токены.
+    timeout = int(settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds())
+    cache.set(inactive_key(pk), True, timeout)
+
+
+def clear_inactive(pk):
+    cache.delete(inactive_key(pk))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+def credentials_key(userid, password):
+    return salted_hmac(
+        "users.authentication.basic", f"{userid}\0{password}"
+    ).hexdigest()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    def authenticate_credentials(self, userid, password, request=None):
+        key = credentials_key(userid, password)
+        entry = credential_cache.get(key)
+        if entry is not None:
+            pk, password_hash = entry
+            user = get_cached_user(pk)
+            if (
+                user is not None
+                and user.is_active
+                and constant_time_compare(user.password, password_hash)
+            ):
+                return user, None
+            credential_cache.invalidate(key)
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        credential_cache.set(key, (user.pk, user.password))
+        return user, auth
+
+
+class ClaimsUser(TokenUser):
+    """TokenUser с id того же типа, что и pk модели (в токене он строкой)."""
+
+    @cached_property
+    def id(self):
+        user_id = self.token[api_settings.USER_ID_CLAIM]
+        return get_user_model()._meta.pk.to_python(user_id)
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = ClaimsUser(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and cache.get(inactive_key(user.pk)):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    async def aauthenticate(self, request):
+        """authenticate() для async view: отметка деактивации читается через aget."""
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = ClaimsUser(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and await cache.aget(
+            inactive_key(user.pk)
+        ):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user, validated_token
+
+
+def stateless_authentication_classes():
+    """DEFAULT_AUTHENTICATION_CLASSES, где JWT заменен на StatelessJWTAuthentication."""
+    return [
+        StatelessJWTAuthentication if issubclass(cls, JWTAuthentication) else cls
+        for cls in drf_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ]
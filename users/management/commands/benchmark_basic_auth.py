@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import base64
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from fonts_app.bench import measure, percentile
+from users.authentication import (
+    CachedBasicAuthentication,
+    credential_cache,
+    user_cache,
+)
+
+EMAIL = "bench-basic@example.com"
+PASSWORD = "bench-Password-123"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark requests per second of HTTP Basic authentication with and "
+        "without the verified-credential cache. Uses the configured password "
+        "hasher; the benchmark user is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args: Any, **options: Any):
+        count = options["requests"]
+        factory = APIRequestFactory()
+        credentials = base64.b64encode(f"{EMAIL}:{PASSWORD}".encode()).decode()
+
+        self.stdout.write(f"hasher: {get_hasher().algorithm}, requests: {count}")
+        self.stdout.write(
+            f"{'authentication':<28}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        with transaction.atomic():
+            get_user_model().objects.create_user(
+                username="bench-basic", email=EMAIL, password=PASSWORD
+            )
+            for auth_class in (BasicAuthentication, CachedBasicAuthentication):
+                credential_cache.clear()
+                user_cache.clear()
+                view = self.view(auth_class)
+
+                def call():
+                    request = factory.get(
+                        "/", HTTP_AUTHORIZATION=f"Basic {credentials}"
+                    )
+                    response = view(request)
+                    assert response.status_code == 204, response.status_code
+
+                timings = measure(call, count)
+                self.stdout.write(
+                    f"{auth_class.__name__:<28}"
+                    f"{count / (sum(timings) / 1000):>10.1f}"
+                    f"{percentile(timings, 50):>10.2f}"
+                    f"{percentile(timings, 99):>10.2f}"
+                )
+            transaction.set_rollback(True)
+
+    def view(self, auth_class):
+        class BenchView(APIView):
+            authentication_classes = [auth_class]
+            permission_classes = [IsAuthenticated]
+
+            def get(self, request):
+                return Response(status=204)
+
+        return BenchView.as_view()
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired OutstandingToken rows and their BlacklistedToken rows "
+        "in small transactions, unlike flushexpiredtokens which deletes "
+        "everything in one statement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between chunks to let other writers in.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count expired tokens.",
+        )
+
+    def handle(self, *args: Any, **options: Any):
+        expired = OutstandingToken.objects.filter(expires_at__lt=timezone.now())
+        if options["dry_run"]:
+            self.stdout.write(f"expired tokens: {expired.count()}")
+            return
+
+        deleted_tokens = deleted_blacklisted = 0
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    expired.order_by("pk").values_list("pk", flat=True)[
+                        : options["chunk_size"]
+                    ]
+                )
+                if not ids:
+                    break
+                blacklisted, _ = BlacklistedToken.objects.filter(
+                    token_id__in=ids
+                ).delete()
+                tokens, _ = OutstandingToken.objects.filter(pk__in=ids).delete()
+            deleted_blacklisted += blacklisted
+            deleted_tokens += tokens
+            if options["verbosity"] > 1:
+                self.stdout.write(f"deleted {deleted_tokens} tokens so far")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            f"deleted: {deleted_tokens} outstanding, {deleted_blacklisted} blacklisted"
+        )
@@ -1,15 +1,29 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
 class SuppressBrowserAuthMiddleware:
     """
     Middleware для удаления заголовка WWW-Authenticate из ответов 401,
     чтобы предотвратить появление диалога аутентификации браузера
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(await self.get_response(request))
 
+    def process_response(self, response):
         # Если ответ 401 и есть заголовок WWW-Authenticate
         if response.status_code == 401 and 'WWW-Authenticate' in response:
             # Удаляем заголовок
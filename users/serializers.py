@@ -1,9 +1,19 @@
 from django.contrib.auth import get_user_model
+from djangoProject.metrics import TimedSerializerMixin
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer,
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 
+from .authentication import get_cached_user
+from .tokens import CachedRefreshToken
+
 
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = "email"
@@ -11,7 +21,44 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     default_error_messages = {"no_active_account": "Неверный email или пароль"}
 
 
-class UserSerializer(serializers.ModelSerializer):
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление токенов без запроса пользователя из БД (берется из кэша
+    процесса) и с проверкой черного списка через кэш (CachedRefreshToken).
+    """
+
+    token_class = CachedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        user = get_cached_user(refresh.payload.get(api_settings.USER_ID_CLAIM))
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+
+            data["refresh"] = str(refresh)
+
+        return data
+
+
+class CachedTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = CachedRefreshToken
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = [
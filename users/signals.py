@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import clear_inactive, mark_inactive, user_cache
+from .tokens import mark_blacklisted
+
+
+def invalidate_user(sender, instance, **kwargs):
+    # Смена пароля, деактивация и любое другое сохранение сбрасывают кэш.
+    # Сброс повторяется после коммита: иначе параллельный запрос успеет
+    # закэшировать прежнюю строку (старый пароль, is_active) до коммита.
+    pk = instance.pk
+    user_cache.invalidate(pk)
+    inactive = kwargs.get("signal") is post_delete or not instance.is_active
+
+    def invalidate():
+        user_cache.invalidate(pk)
+        if inactive:
+            mark_inactive(pk)
+        else:
+            clear_inactive(pk)
+
+    transaction.on_commit(invalidate)
+
+
+post_save.connect(invalidate_user, sender=get_user_model())
+post_delete.connect(invalidate_user, sender=get_user_model())
+
+
+def cache_blacklisted(sender, instance, created, **kwargs):
+    # Любое занесение в черный список, в том числе из админки.
+    if created:
+        jti, exp = instance.token.jti, instance.token.expires_at.timestamp()
+        # После коммита: при откате отметка осталась бы без строки в базе.
+        transaction.on_commit(lambda: mark_blacklisted(jti, exp))
+
+
+post_save.connect(cache_blacklisted, sender=BlacklistedToken)
@@ -0,0 +1,347 @@
+import base64
+import datetime
+import json
+import logging
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from djangoProject.log import QueueLogHandler
+from fonts_app.models import Cart, Order
+from fonts_app.tests import make_catalog
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import TTLCache, credential_cache, credentials_key, user_cache
+from .tokens import CachedRefreshToken, blacklist_key
+
+
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.prices = make_catalog()
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def user_queries(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        table = get_user_model()._meta.db_table
+        return response, [q for q in queries if f'FROM "{table}"' in q["sql"]]
+
+    def test_user_cache_lru_and_ttl(self):
+        users = TTLCache(maxsize=2, ttl=60)
+        for pk in (1, 2, 3):
+            users.set(pk, self.user)
+        self.assertIsNone(users.get(1))
+        self.assertEqual(users.get(3), self.user)
+        self.assertIsNot(users.get(3), users.get(3))
+
+        expired = TTLCache(maxsize=2, ttl=-1)
+        expired.set(1, self.user)
+        self.assertIsNone(expired.get(1))
+
+    def test_jwt_user_is_cached_until_saved(self):
+        url = reverse("user_orders")
+        response, queries = self.user_queries("get", url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.user_queries("get", url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+        self.user.is_active = False
+
+        with self.captureOnCommitCallbacks(execute=True):
+
+            self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_session_user_is_cached(self):
+        self.client.credentials()
+        self.client.force_login(self.user)
+        url = reverse("user_orders")
+        self.user_queries("get", url)
+        response, queries = self.user_queries("get", url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_cart_views_authenticate_from_claims(self):
+        response, queries = self.user_queries(
+            "post", reverse("add_to_cart", args=[self.prices[0].pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        self.assertEqual(Cart.objects.get().user_id, self.user.pk)
+
+        response, queries = self.user_queries("get", reverse("cart"))
+        self.assertEqual(queries, [])
+        self.assertEqual(len(response.data["items"]), 1)
+
+        response = self.client.post(reverse("create_order"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get().user_id, self.user.pk)
+
+    def test_cart_views_reject_deactivated_user(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(reverse("cart"))
+        self.assertEqual(response.status_code, 401)
+
+        self.user.is_active = True
+
+        with self.captureOnCommitCallbacks(execute=True):
+
+            self.user.save()
+        self.assertEqual(self.client.get(reverse("cart")).status_code, 200)
+
+
+class CachedBasicAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        credential_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="script", email="script@example.com", password="pass"
+        )
+        self.url = reverse("user_orders")
+
+    def get(self, password):
+        credentials = base64.b64encode(f"script@example.com:{password}".encode())
+        return self.client.get(
+            self.url, HTTP_AUTHORIZATION=f"Basic {credentials.decode()}"
+        )
+
+    def test_password_is_checked_once(self):
+        with mock.patch(
+            "django.contrib.auth.base_user.check_password", wraps=check_password
+        ) as checks:
+            for _ in range(3):
+                self.assertEqual(self.get("pass").status_code, 200)
+            self.assertEqual(self.get("wrong").status_code, 401)
+            self.assertEqual(self.get("wrong").status_code, 401)
+        self.assertEqual(checks.call_count, 3)
+
+        key = credentials_key("script@example.com", "pass")
+        self.assertNotIn("pass", key)
+        self.assertEqual(credential_cache.get(key)[0], self.user.pk)
+
+    def test_password_change_invalidates(self):
+        self.assertEqual(self.get("pass").status_code, 200)
+        self.user.set_password("new-pass")
+        self.user.save()
+
+        self.assertEqual(self.get("pass").status_code, 401)
+        self.assertEqual(self.get("new-pass").status_code, 200)
+
+    def test_deactivation_invalidates(self):
+        self.assertEqual(self.get("pass").status_code, 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertEqual(self.get("pass").status_code, 401)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_basic_auth", requests=3, stdout=out)
+        self.assertIn("CachedBasicAuthentication", out.getvalue())
+        self.assertFalse(
+            get_user_model().objects.filter(email="bench-basic@example.com").exists()
+        )
+
+
+class TokenBlacklistCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+
+    def refresh(self, token):
+        self.client.cookies["refresh_token"] = str(token)
+        return self.client.post("/api/token/refresh/")
+
+    def blacklist_queries(self, token):
+        with CaptureQueriesContext(connection) as queries:
+            try:
+                CachedRefreshToken(str(token))
+            except TokenError:
+                pass
+        return [q for q in queries if "token_blacklist_blacklistedtoken" in q["sql"]]
+
+    def test_rotation_blacklists_old_token_in_cache(self):
+        token = CachedRefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        new_token = response.cookies["refresh_token"].value
+        self.assertIs(cache.get(blacklist_key(token["jti"])), True)
+
+        self.assertEqual(self.blacklist_queries(token), [])
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+        self.assertEqual(self.refresh(new_token).status_code, 200)
+
+    def test_negative_result_is_cached(self):
+        token = CachedRefreshToken.for_user(self.user)
+        self.assertEqual(len(self.blacklist_queries(token)), 1)
+        self.assertEqual(self.blacklist_queries(token), [])
+        self.assertIs(cache.get(blacklist_key(token["jti"])), False)
+
+        # Занесение в черный список в обход токена (админка) обновляет кэш,
+        # но только после коммита.
+        outstanding = OutstandingToken.objects.get(jti=token["jti"])
+        with self.captureOnCommitCallbacks() as callbacks:
+            BlacklistedToken.objects.create(token=outstanding)
+        self.assertIs(cache.get(blacklist_key(token["jti"])), False)
+
+        callbacks[0]()
+        with self.assertRaises(TokenError):
+            CachedRefreshToken(str(token))
+
+    @override_settings(TOKEN_BLACKLIST_NEGATIVE_TTL=60)
+    def test_negative_result_expires_quickly(self):
+        token = CachedRefreshToken.for_user(self.user)
+        with mock.patch("users.tokens.cache.add") as add:
+            CachedRefreshToken(str(token))
+        key, value, timeout = add.call_args.args
+        self.assertEqual(
+            (key, value, timeout), (blacklist_key(token["jti"]), False, 60)
+        )
+
+    def test_logout_blacklists_token(self):
+        token = CachedRefreshToken.for_user(self.user)
+        self.client.cookies["refresh_token"] = str(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("users:token_blacklist"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_prune_token_blacklist(self):
+        now = timezone.now()
+        for i in range(5):
+            expires_at = now + datetime.timedelta(days=-1 if i < 3 else 1)
+            outstanding = OutstandingToken.objects.create(
+                jti=f"jti-{i}", token="-", expires_at=expires_at, user=self.user
+            )
+            if i % 2 == 0:
+                BlacklistedToken.objects.create(token=outstanding)
+
+        out = StringIO()
+        call_command("prune_token_blacklist", chunk_size=2, stdout=out)
+
+        self.assertIn("deleted: 3 outstanding, 2 blacklisted", out.getvalue())
+        self.assertEqual(
+            sorted(OutstandingToken.objects.values_list("jti", flat=True)),
+            ["jti-3", "jti-4"],
+        )
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class LoggingTests(APITestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.path = os.path.join(self.log_dir, "app.log")
+        self.handler = QueueLogHandler(self.path, sample_rates={"hot": 0.0})
+        self.addCleanup(self.handler.close)
+        self.logger = logging.getLogger("users.tests.logging")
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def records(self):
+        self.handler.drain()
+        with open(self.path, encoding="utf-8") as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_json_records_with_redaction(self):
+        token = str(AccessToken())
+        self.logger.info(
+            "token %s for user %s", token, 7, extra={"refresh_token": "x", "user": 7}
+        )
+
+        (record,) = self.records()
+        self.assertEqual(record["level"], "INFO")
+        self.assertEqual(record["logger"], "users.tests.logging")
+        self.assertEqual(record["message"], "token [REDACTED] for user 7")
+        self.assertEqual(record["refresh_token"], "[REDACTED]")
+        self.assertEqual(record["user"], 7)
+
+    def test_extra_values_are_redacted(self):
+        token = str(AccessToken())
+        self.logger.info(
+            "refresh", extra={"detail": f"bad {token}", "body": {"tokens": [token]}}
+        )
+
+        (record,) = self.records()
+        self.assertEqual(record["detail"], "bad [REDACTED]")
+        self.assertEqual(record["body"], {"tokens": ["[REDACTED]"]})
+
+    def test_only_project_loggers_use_log_level(self):
+        self.assertEqual(settings.LOGGING["root"]["level"], "WARNING")
+        loggers = settings.LOGGING["loggers"]
+        for name in ("djangoProject", "fonts_app", "users"):
+            self.assertEqual(loggers[name]["level"], settings.LOG_LEVEL)
+        self.assertEqual(loggers["django"]["level"], "WARNING")
+
+    def test_level_and_sampling(self):
+        class Unprintable:
+            def __str__(self):
+                raise AssertionError("formatted below level")
+
+        self.logger.debug("skipped %s", Unprintable())
+        self.logger.info("sampled out", extra={"event": "hot"})
+        self.logger.warning("always kept", extra={"event": "hot"})
+
+        self.assertEqual([r["message"] for r in self.records()], ["always kept"])
+
+    def test_full_queue_drops_records(self):
+        self.handler.listener.stop()
+        self.handler.queue.maxsize = 1
+        self.logger.info("first")
+        self.logger.info("second")
+        self.assertEqual(self.handler.dropped, 1)
+        self.handler.listener.start()
+        self.assertEqual([r["message"] for r in self.records()], ["first"])
+
+    def test_refresh_view_does_not_log_tokens(self):
+        user = get_user_model().objects.create_user(
+            username="buyer", email="buyer@example.com", password="pass"
+        )
+        token = str(CachedRefreshToken.for_user(user))
+        self.client.cookies["refresh_token"] = token
+        with self.assertLogs("users.views", "INFO") as logs:
+            response = self.client.post("/api/token/refresh/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logs.records[0].event, "token_refresh")
+        output = "\n".join(logs.output)
+        self.assertNotIn(token, output)
+        self.assertNotIn(response.data["access"], output)
@@ -0,0 +1,55 @@
+"""
+Проверка refresh-токена по черному списку через кэш (Redis в проде, locmem
+в тестах) вместо запроса к token_blacklist на каждую проверку.
+
+В кэше по jti лежит True (токен в черном списке) до истечения токена -
+после этого он не пройдет проверку exp и так. True записывается после
+коммита любого занесения в черный список (users.signals).
+
+False (не в черном списке) живет не дольше TOKEN_BLACKLIST_NEGATIVE_TTL
+и кладется только через cache.add, чтобы не затереть параллельно
+поставленную отметку. Если отметка все же потеряна (сбой кэша, запись
+в обход сигнала), токен снова проверяется по базе через этот срок.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def blacklist_key(jti):
+    return f"tokens:blacklisted:{jti}"
+
+
+def blacklist_timeout(exp):
+    return max(1, int(exp - time.time()))
+
+
+def mark_blacklisted(jti, exp):
+    cache.set(blacklist_key(jti), True, blacklist_timeout(exp))
+
+
+class CachedRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        key = blacklist_key(jti)
+        blacklisted = cache.get(key)
+        if blacklisted is None:
+            blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+            if blacklisted:
+                cache.set(key, True, blacklist_timeout(self.payload["exp"]))
+            else:
+                timeout = min(
+                    settings.TOKEN_BLACKLIST_NEGATIVE_TTL,
+                    blacklist_timeout(self.payload["exp"]),
+                )
+                cache.add(key, False, timeout)
+
+        if blacklisted:
+            raise TokenError(_("Token is blacklisted"))
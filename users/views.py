@@ -1,6 +1,7 @@
 import logging
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.generics import (
@@ -15,10 +16,6 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.exceptions import TokenError
-from rest_framework_simplejwt.serializers import (
-    TokenBlacklistSerializer,
-    TokenRefreshSerializer,
-)
 from rest_framework_simplejwt.tokens import (
     RefreshToken
 )
@@ -28,7 +25,10 @@ from rest_framework_simplejwt.views import (
 )
 from rest_framework import status
 from djoser.email import PasswordResetEmail
+from fonts_app.service import CartService
 from .serializers import (
+    CachedTokenBlacklistSerializer,
+    CachedTokenRefreshSerializer,
     EmailTokenObtainPairSerializer,
     UserSerializer,
 )
@@ -48,7 +48,7 @@ class CustomPasswordResetEmail(PasswordResetEmail):
 
 
 class CustomTokenBlacklistView(TokenBlacklistView):
-    serializer_class = TokenBlacklistSerializer
+    serializer_class = CachedTokenBlacklistSerializer
 
     def post(self, request, *args, **kwargs):
         cookies_refresh_token = request.COOKIES.get('refresh_token')
@@ -171,6 +171,10 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        # Анонимная корзина из cookie сохраняется в БД за пользователем.
+        with transaction.atomic():
+            CartService.merge_guest_cart(request, serializer.user)
+
         validated_data = serializer.validated_data
         access_token = validated_data.get("access")
         refresh_token = validated_data.pop("refresh")
@@ -191,10 +195,12 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 class RefreshTokenView(APIView):
     def post(self, request, *args, **kwargs):
         refresh_token = request.COOKIES.get("refresh_token")
-        logger.warning(f"Refresh_token: {refresh_token}")
 
         if refresh_token is None:
-            logger.warning("Необходимо пройти авторизацию")
+            logger.info(
+                "Необходимо пройти авторизацию: нет refresh-токена",
+                extra={"event": "token_refresh", "result": "missing"},
+            )
             return Response(
                 {
                     "error": "Необходимо пройти авторизацию",
@@ -202,12 +208,16 @@ class RefreshTokenView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
-        serializer = TokenRefreshSerializer(data={"refresh": refresh_token})
+        serializer = CachedTokenRefreshSerializer(data={"refresh": refresh_token})
 
         try:
             serializer.is_valid(raise_exception=True)
         except TokenError as e:
-            logger.warning("Необходимо пройти авторизацию 2")
+            logger.info(
+                "Необходимо пройти авторизацию: %s",
+                e,
+                extra={"event": "token_refresh", "result": "invalid"},
+            )
             return Response(
                 {
                     "error": "Необходимо пройти авторизацию",
@@ -218,8 +228,10 @@ class RefreshTokenView(APIView):
         access = serializer.validated_data.get("access")
         new_refresh = serializer.validated_data.get("refresh")
 
-        logger.warning(f"Access: {access}")
-        logger.warning(f"New refresh: {new_refresh}")
+        logger.info(
+            "Токены обновлены",
+            extra={"event": "token_refresh", "result": "ok", "rotated": bool(new_refresh)},
+        )
         response = Response({"access": access}, status=status.HTTP_200_OK)
         if new_refresh:
             response.set_cookie(